@@ -1,11 +1,26 @@
 # 飞行经历起落数查询助手
 
 import re
+import argparse
+import csv
+import io
+import json
+import math
 import platform
 import os
+import shutil
+import sqlite3
+import sys
+import queue
+import tempfile
+import threading
+import time
+import zipfile
+from collections import deque
 from datetime import datetime
+from html.parser import HTMLParser
 from colorama import init, Fore, Style
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
 
 try:
     from openpyxl import load_workbook
@@ -62,12 +77,21 @@ def normalize_date(date_str: str) -> str:
     return date_str
 
 
+# 员工号两侧不能紧挨数字或字母，可以直接跟汉字姓名(\b会把汉字当成单词字符)
+EMP_BOUNDED_RE = re.compile(r'(?<![\dA-Za-z_])\d{6}(?![\dA-Za-z_])')
+EMP_ID_RE = re.compile(r'\d{6}')
+# 连写记录的起点：6位数字紧跟汉字，前面是文本开头、空白、标点或上一条的日期(分隔符后两位的日)
+# 前面紧挨数字或字母时是别的数字的一部分(1234567张三、A123456张三、2026010张三)，不在这里切
+RECORD_START_RE = re.compile(r'(?:(?<![\dA-Za-z_])|(?<=[-/]\d\d))(?=\d{6}[\u4e00-\u9fa5])')
+LINE_RE = re.compile(r'[^\n]+')
+
+
 def parse_single_record(text: str) -> dict:
     """解析单条记录"""
     result = {"员工号": None, "姓名": None, "开始日期": None, "结束日期": None}
-    emp = re.search(r'\b(\d{6})\b', text)
+    emp = EMP_BOUNDED_RE.search(text)
     if emp:
-        result["员工号"] = emp.group(1)
+        result["员工号"] = emp.group()
     name = re.search(r'\d{6}\s*([\u4e00-\u9fa5]{2,4})', text)
     if name:
         result["姓名"] = name.group(1)
@@ -78,20 +102,50 @@ def parse_single_record(text: str) -> dict:
     return result
 
 
+def iter_record_parts(text: str, pos: int = 0, endpos: int = None):
+    """在text[pos:endpos]里按记录起点逐条产出记录，不含员工号的片段丢掉
+    
+    只在相邻两个起点之间切片，不先把整段拆成列表
+    """
+    if endpos is None:
+        endpos = len(text)
+    for m in RECORD_START_RE.finditer(text, pos, endpos):
+        part = text[pos:m.start()].strip()
+        if part and EMP_ID_RE.search(part):
+            yield part
+        pos = m.start()
+    part = text[pos:endpos].strip()
+    if part and EMP_ID_RE.search(part):
+        yield part
+
+
 def split_continuous_text(text: str) -> list:
     """把连续粘贴的文本按员工号切分成多条记录"""
-    parts = re.split(r'(?=\d{6}[\u4e00-\u9fa5])', text)
-    return [p.strip() for p in parts if p.strip() and re.search(r'\d{6}', p)]
+    return list(iter_record_parts(text))
+
+
+def iter_segments(text: str):
+    """把粘贴的文本逐条切成记录，换行分隔和员工号连写可以混在一起
+    
+    一行是一条记录；一行里有两处以上记录起点(换行丢失)时才按员工号切开。
+    逐行边切边产出，不会把整段文本拆成列表，很长的一行也只在原文上切片
+    """
+    for m in LINE_RE.finditer(text):
+        start, end = m.span()
+        starts = RECORD_START_RE.finditer(text, start, end)
+        if next(starts, None) and next(starts, None):
+            yield from iter_record_parts(text, start, end)
+            continue
+        line = m.group().strip()
+        if line:
+            yield line
 
 
 def parse_batch_input(text: str, whitelist: set = None) -> tuple:
     """解析批量输入"""
     records = []
     errors = []
-    lines = [line.strip() for line in text.strip().split('\n') if line.strip()]
-    if len(lines) == 1 and len(lines[0]) > 100:
-        lines = split_continuous_text(lines[0])
-    for i, line in enumerate(lines, 1):
+    for i, line in enumerate(iter_segments(text), 1):
         record = parse_single_record(line)
         if whitelist and record["员工号"] and record["员工号"] not in whitelist:
             continue
@@ -105,17 +159,16 @@ def parse_batch_input(text: str, whitelist: set = None) -> tuple:
     return records, errors
 
 
-def parse_excel_file(filepath: str, whitelist: set = None) -> tuple:
-    """解析Excel文件，返回(records, errors)"""
-    if not HAS_OPENPYXL:
-        return [], ["未安装openpyxl库，请运行: pip install openpyxl"]
-    
-    records = []
-    errors = []
-    
+def iter_excel_records(filepath: str, whitelist: set = None, errors: list = None):
+    """逐行读取Excel文件，产出校验通过的记录，错误追加到errors"""
+    if errors is None:
+        errors = []
+    # 只读模式逐行读取，不载入单元格样式，读大文件时工作簿本身占的内存小得多
+    wb = load_workbook(filepath, read_only=True, data_only=True)
     try:
-        wb = load_workbook(filepath, data_only=True)
         ws = wb.active
+        # 有些软件导出的文件尺寸信息不准，按实际存在的行读取
+        ws.reset_dimensions()
         
         for row_num, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
             if not row or not any(row):
@@ -148,20 +201,136 @@ def parse_excel_file(filepath: str, whitelist: set = None) -> tuple:
                 errors.append(f"第{row_num}行: 日期格式错误")
                 continue
             
-            records.append({
+            yield {
                 "员工号": emp_id,
                 "姓名": name,
                 "开始日期": start,
                 "结束日期": end or start
-            })
-        
+            }
+    finally:
         wb.close()
+
+
+def parse_excel_file(filepath: str, whitelist: set = None) -> tuple:
+    """解析Excel文件，返回(records, errors)
+    
+    记录仍收集成列表：处理前要知道总条数，多页并发和按输入顺序写结果都要用到全部记录
+    """
+    if not HAS_OPENPYXL:
+        return [], ["未安装openpyxl库，请运行: pip install openpyxl"]
+    
+    records = []
+    errors = []
+    
+    try:
+        for record in iter_excel_records(filepath, whitelist, errors):
+            records.append(record)
     except Exception as e:
         errors.append(f"读取Excel失败: {e}")
     
     return records, errors
 
 
+# 就绪等待：默认等待页面的真实信号（日期控件弹出/关闭、查询请求返回、tbody.list刷新）
+# 页面异常时可把FIXED_SLEEP改为True，退回原来的固定等待
+FIXED_SLEEP = False
+READY_TIMEOUT = 10000   # 等待信号的最长时间(毫秒)，超时按已就绪继续（查询请求和表格刷新超时则该条失败）
+RENDER_TIMEOUT = 3000   # 查询请求返回后等待表格刷新的最长时间(毫秒)
+
+# fixed: 原固定等待应耗时, waited: 实际等待耗时(毫秒)
+READY_STATS = {"fixed": 0, "waited": 0.0}
+# 多页并发时各线程都会更新READY_STATS和STEP_STATS
+STATS_LOCK = threading.Lock()
+
+# 各页面等不到信号、按已就绪继续的次数，按id(page)记录；期间查到的结果不写入缓存
+READY_DEGRADED = {}
+
+TABLE_CHANGED_JS = """(before) => {
+    const tbody = document.querySelector('tbody.list');
+    return !!tbody && tbody.innerHTML !== before;
+}"""
+
+
+def wait_ready(page, legacy_ms, signal=None, required=False):
+    """等待页面就绪
+    
+    Args:
+        page: playwright页面对象
+        legacy_ms: 原来的固定等待毫秒数，FIXED_SLEEP时照此等待，并用于统计节省时间
+        signal: 等待真实信号的函数；None表示后续操作自带等待，无需额外等待
+        required: 为True时信号超时直接抛出，不按已就绪继续
+    """
+    start = time.perf_counter()
+    try:
+        if FIXED_SLEEP:
+            page.wait_for_timeout(legacy_ms)
+        elif signal is not None:
+            try:
+                signal()
+            except PlaywrightTimeoutError:
+                if required:
+                    raise
+                mark_degraded(page)
+    finally:
+        with STATS_LOCK:
+            READY_STATS["fixed"] += legacy_ms
+            READY_STATS["waited"] += (time.perf_counter() - start) * 1000
+
+
+def mark_degraded(page):
+    """记一次没等到信号就继续"""
+    READY_DEGRADED[id(page)] = READY_DEGRADED.get(id(page), 0) + 1
+
+
+def ready_report(before, count=1):
+    """返回就绪等待统计文字，before为开始前的READY_STATS副本"""
+    fixed = READY_STATS["fixed"] - before["fixed"]
+    waited = READY_STATS["waited"] - before["waited"]
+    saved = (fixed - waited) / max(count, 1) / 1000
+    if count > 1:
+        return f"平均每条等待{waited / count / 1000:.1f}s,比固定等待节省{saved:.1f}s"
+    return f"等待{waited / 1000:.1f}s,比固定等待节省{saved:.1f}s"
+
+
+def date_picker(page):
+    """日期控件所在的iframe"""
+    return page.locator("iframe").nth(2)
+
+
+def open_date_picker(page, selector, clear_first=False):
+    """点击日期输入框并等待日期控件弹出"""
+    def picker_shown():
+        date_picker(page).wait_for(state="visible", timeout=READY_TIMEOUT)
+    
+    page.locator(selector).click()
+    wait_ready(page, 200, picker_shown)
+    if clear_first:
+        # 第二次及以后有时需要再点一次才会弹出日期选择器
+        if FIXED_SLEEP or not date_picker(page).is_visible():
+            page.locator(selector).click()
+        wait_ready(page, 200, picker_shown)
+
+
+def table_snapshot(page):
+    """tbody.list当前内容，用于判断查询结果是否已刷新"""
+    return page.evaluate("""() => {
+        const tbody = document.querySelector('tbody.list');
+        return tbody ? tbody.innerHTML : null;
+    }""")
+
+
+def is_query_response(response, emp_id):
+    """查询按钮发出的请求：URL或请求体里带着本次查询员工号的xhr/fetch请求"""
+    request = response.request
+    if request.resource_type not in ("xhr", "fetch"):
+        return False
+    try:
+        body = request.post_data or ""
+    except (UnicodeDecodeError, ValueError):
+        body = ""
+    return str(emp_id) in request.url or str(emp_id) in body
+
+
 def fill_date(page, date_str):
     """填写日期到日期选择器"""
     parts = date_str.split('/')
@@ -180,31 +349,188 @@ def fill_date(page, date_str):
     month_cn = month_map.get(month, month)
     day_str = str(int(day))  # 去掉前导0
     
+    frame = date_picker(page).content_frame
+    
     # 等待iframe加载
-    page.wait_for_timeout(300)
+    wait_ready(page, 300, lambda: frame.get_by_role("textbox").nth(1).wait_for(timeout=READY_TIMEOUT))
     
+    # 以下每步点击都会自动等待目标单元格出现，不再额外等待
     # 1. 点击年份输入框
-    page.locator("iframe").nth(2).content_frame.get_by_role("textbox").nth(1).click()
-    page.wait_for_timeout(100)
+    frame.get_by_role("textbox").nth(1).click()
+    wait_ready(page, 100)
     
     # 2. 选择年份
-    page.locator("iframe").nth(2).content_frame.get_by_role("cell", name=year).click()
-    page.wait_for_timeout(100)
+    frame.get_by_role("cell", name=year).click()
+    wait_ready(page, 100)
     
     # 3. 点击月份输入框
-    page.locator("iframe").nth(2).content_frame.get_by_role("textbox").first.click()
-    page.wait_for_timeout(100)
+    frame.get_by_role("textbox").first.click()
+    wait_ready(page, 100)
     
     # 4. 选择月份
-    page.locator("iframe").nth(2).content_frame.get_by_role("cell", name=month_cn).click()
-    page.wait_for_timeout(100)
+    frame.get_by_role("cell", name=month_cn).click()
+    wait_ready(page, 100)
     
     # 5. 选择日期 - 使用first选择第一个匹配的日期（避免匹配到15、25等）
-    page.locator("iframe").nth(2).content_frame.get_by_role("cell", name=day_str).first.click()
-    page.wait_for_timeout(100)
+    frame.get_by_role("cell", name=day_str).first.click()
+    # 选中日期后控件会关闭
+    wait_ready(page, 100, lambda: date_picker(page).wait_for(state="hidden", timeout=READY_TIMEOUT))
+
+
+# 日期按日期控件的格式直接写入输入框并触发页面监听的事件，写入未生效时这一次改走日期控件逐级点选。
+# 是否真正进入查询条件以查询请求里的日期为准，见query_flight_record；
+# 连续FAST_DATE_MISSES条都没进入时，本次运行不再直接写入
+FAST_DATE = True
+FAST_DATE_MISSES = 3
+# sep: 控件没写dateFmt时用的分隔符(My97DatePicker默认yyyy-MM-dd)，点选一次后按控件写出的值更新
+# misses: 直接写入的日期连续没进入查询请求的条数, off: 本次运行已停用直接写入
+DATE_INPUT = {"sep": "-", "misses": 0, "off": False}
+DATE_LOCK = threading.Lock()
+
+WRITE_DATE_JS = """async ([selector, year, month, day, sep]) => {
+    const input = document.querySelector(selector);
+    if (!input) return null;
+    // My97DatePicker的格式写在onclick/onfocus的dateFmt里
+    const config = (input.getAttribute('onclick') || '') + (input.getAttribute('onfocus') || '');
+    const match = config.match(/dateFmt\\s*:\\s*['"]([^'"]+)['"]/);
+    const value = (match ? match[1] : ['yyyy', 'MM', 'dd'].join(sep))
+        .replace('yyyy', year).replace('MM', month).replace('dd', day);
+    // 带时间或单字母月日的格式不直接写入
+    if (/[A-Za-z]/.test(value)) return null;
+    input.value = value;
+    for (const type of ['input', 'change', 'blur']) {
+        input.dispatchEvent(new Event(type, { bubbles: true }));
+    }
+    // 等页面处理完事件后再确认值没有被控件改回
+    await new Promise(resolve => setTimeout(resolve, 0));
+    return input.value === value ? value : null;
+}"""
+
+READ_VALUE_JS = "(selector) => { const input = document.querySelector(selector); return input ? input.value : ''; }"
+
+
+def write_date(page, selector, date_str):
+    """直接写入日期输入框，返回写入的值，未生效时返回None"""
+    parts = date_str.split('/')
+    if len(parts) != 3:
+        return None
+    return page.evaluate(WRITE_DATE_JS, [selector, *parts, DATE_INPUT["sep"]])
+
+
+def set_date(page, selector, date_str, clear_first=False, fast=None):
+    """填写日期：优先直接写入，未生效时这一次退回日期控件点选
+    
+    Args:
+        fast: 是否尝试直接写入，None时按FAST_DATE和本次运行是否已停用
+    
+    Returns:
+        bool: 是否用的直接写入
+    """
+    if fast is None:
+        fast = FAST_DATE and not DATE_INPUT["off"]
+    if fast and write_date(page, selector, date_str):
+        return True
+    open_date_picker(page, selector, clear_first)
+    fill_date(page, date_str)
+    # 记下控件实际写出的分隔符，下次直接写入时照用
+    value = page.evaluate(READ_VALUE_JS, selector)
+    for sep in "/-":
+        if sep in value:
+            DATE_INPUT["sep"] = sep
+    return False
+
+
+def request_has_dates(request, start_date, end_date):
+    """查询请求里是否带着这两个日期(任一种写法)"""
+    try:
+        text = request.url + "\n" + (request.post_data or "")
+    except (UnicodeDecodeError, ValueError):
+        text = request.url
+    return all(any(v in text for v in date_variants(d).values()) for d in (start_date, end_date))
+
+
+def fast_date_checked(ok):
+    """记录一次直接写入的日期是否进入了查询请求，连续FAST_DATE_MISSES次没进入时停用直接写入"""
+    with DATE_LOCK:
+        if ok:
+            DATE_INPUT["misses"] = 0
+            return
+        DATE_INPUT["misses"] += 1
+        if DATE_INPUT["misses"] < FAST_DATE_MISSES or DATE_INPUT["off"]:
+            return
+        DATE_INPUT["off"] = True
+    print(c_warn(f"连续{FAST_DATE_MISSES}条直接写入的日期没有进入查询条件，本次运行改用日期控件点选"))
+
+
+# 耗时追踪：每条记录的各步骤耗时(毫秒)追加写入TRACE_FILE(每行一个JSON)，空字符串表示不写
+TRACE_FILE = "flight_trace.jsonl"
+TRACE_LOCK = threading.Lock()
+STEP_STATS = {}
+RUN_STATS = {"run": datetime.now().strftime("%Y%m%d_%H%M%S"), "start": time.perf_counter(), "records": 0}
+
+
+def mark_step(timings, step, start):
+    """记录从start到现在的步骤耗时，返回当前时间"""
+    now = time.perf_counter()
+    ms = (now - start) * 1000
+    timings[step] = ms
+    with STATS_LOCK:
+        STEP_STATS.setdefault(step, []).append(ms)
+    return now
+
+
+def percentile(values, p):
+    """最近秩法求第p百分位数"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def start_run():
+    """开始一次批量查询，清空步骤统计"""
+    with STATS_LOCK:
+        STEP_STATS.clear()
+    RUN_STATS.update(run=datetime.now().strftime("%Y%m%d_%H%M%S"), start=time.perf_counter(), records=0)
 
 
-def query_flight_record(page, emp_id, start_date, end_date, clear_first=False):
+def trace_record(record, timings, result):
+    """统计一条记录，并把各步骤耗时追加写入TRACE_FILE"""
+    with TRACE_LOCK:
+        RUN_STATS["records"] += 1
+        if not TRACE_FILE:
+            return
+        entry = {
+            "run": RUN_STATS["run"],
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "员工号": record["员工号"],
+            "开始日期": record["开始日期"],
+            "结束日期": record["结束日期"],
+            "steps": {step: round(ms, 1) for step, ms in timings.items()},
+            "total_ms": round(sum(timings.values()), 1),
+            "result": result,
+        }
+        try:
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(c_warn(f"写入耗时追踪失败: {e}"))
+
+
+def step_report():
+    """返回本次运行各步骤耗时的p50/p95/p99和每分钟处理条数"""
+    lines = ["步骤耗时:"]
+    with STATS_LOCK:
+        stats = {step: list(values) for step, values in STEP_STATS.items()}
+    for step, values in stats.items():
+        if values:
+            lines.append(f"  {step}: p50 {percentile(values, 50):.0f}ms | p95 {percentile(values, 95):.0f}ms | "
+                         f"p99 {percentile(values, 99):.0f}ms ({len(values)}次)")
+    elapsed = time.perf_counter() - RUN_STATS["start"]
+    if RUN_STATS["records"] and elapsed > 0:
+        lines.append(f"共{RUN_STATS['records']}条,用时{elapsed:.0f}s,每分钟{RUN_STATS['records'] / elapsed * 60:.1f}条")
+    return "\n".join(lines)
+
+
+def query_flight_record(page, emp_id, start_date, end_date, clear_first=False, timings=None):
     """执行查询操作
     
     Args:
@@ -213,43 +539,94 @@ def query_flight_record(page, emp_id, start_date, end_date, clear_first=False):
         start_date: 开始日期 (格式: YYYY/MM/DD)
         end_date: 结束日期 (格式: YYYY/MM/DD)
         clear_first: 是否先清空表单（第一次查询不需要清空）
+        timings: 各步骤耗时(毫秒)写入这个字典
     """
+    if timings is None:
+        timings = {}
+    start = time.perf_counter()
     # 填写员工号
     emp_input = page.get_by_placeholder("员工号或姓名")
     emp_input.click()
-    page.wait_for_timeout(100)
+    wait_ready(page, 100)
     
     if clear_first:
         # 第二次及以后：先清空再输入
         emp_input.fill("")
-        page.wait_for_timeout(100)
+        wait_ready(page, 100)
     
     # 用type模拟逐字输入
     emp_input.type(str(emp_id), delay=50)
-    page.wait_for_timeout(300)
+    wait_ready(page, 300)
+    start = mark_step(timings, "员工号", start)
     
-    # 填写开始日期 - 多次点击确保触发日期选择器
-    page.locator("#flyTimeExperience_beginDate").click()
-    page.wait_for_timeout(200)
-    if clear_first:
-        # 第二次及以后需要多点几次
-        page.locator("#flyTimeExperience_beginDate").click()
-        page.wait_for_timeout(200)
-    fill_date(page, start_date)
-    
-    # 填写结束日期 - 多次点击确保触发日期选择器
-    page.locator("#flyTimeExperience_endDate").click()
-    page.wait_for_timeout(200)
-    if clear_first:
-        # 第二次及以后需要多点几次
-        page.locator("#flyTimeExperience_endDate").click()
-        page.wait_for_timeout(200)
-    fill_date(page, end_date)
+    # 填写开始日期和结束日期
+    fast = set_date(page, "#flyTimeExperience_beginDate", start_date, clear_first)
+    start = mark_step(timings, "开始日期", start)
+    fast = set_date(page, "#flyTimeExperience_endDate", end_date, clear_first) or fast
+    start = mark_step(timings, "结束日期", start)
+    
+    wait_ready(page, 300)
+    request = submit_query(page, emp_id)
+    if fast and request is not None:
+        verified = request_has_dates(request, start_date, end_date)
+        fast_date_checked(verified)
+        if not verified:
+            # 直接写入的日期没有进入页面的查询条件，这一条改用日期控件点选后重新查询
+            print(c_warn("日期直接写入未进入查询条件，改用日期控件点选后重新查询"))
+            set_date(page, "#flyTimeExperience_beginDate", start_date, True, fast=False)
+            set_date(page, "#flyTimeExperience_endDate", end_date, True, fast=False)
+            submit_query(page, emp_id)
+    mark_step(timings, "查询", start)
+
+
+def submit_query(page, emp_id):
+    """点击查询，等待查询请求返回且tbody.list刷新，返回查询请求(FIXED_SLEEP时为None)"""
+    before = table_snapshot(page)
+    button = page.get_by_role("button", name="查询")
+    sent = []
     
-    # 点击查询
-    page.wait_for_timeout(300)
-    page.get_by_role("button", name="查询").click()
-    page.wait_for_timeout(1500)
+    def query_done():
+        with page.expect_response(lambda r: is_query_response(r, emp_id), timeout=READY_TIMEOUT) as response_info:
+            button.click()
+        sent.append(response_info.value.request)
+        try:
+            page.wait_for_function(TABLE_CHANGED_JS, arg=before, timeout=RENDER_TIMEOUT)
+        except PlaywrightTimeoutError:
+            # 上一条和这一条都没有数据时表格不会变；表格里还有数据说明没刷新，不能当作这一条的结果
+            if extract_flight_rows(page, limit=1):
+                raise
+            mark_degraded(page)
+    
+    if FIXED_SLEEP:
+        button.click()
+    wait_ready(page, 1500, query_done, required=True)
+    return sent[0] if sent else None
+
+
+# 飞行经历表格列，按表头顺序
+FLIGHT_FIELDS = [
+    "员工号", "姓名", "注册基地", "运行基地", "技术信息", "开始日期", "结束日期",
+    "飞行时间", "飞行经历", "航段数", "夜航经历", "左座经历", "右座经历",
+    "模拟机", "本场时间", "起落总数", "航线起落", "本场起落", "人工飞行时间",
+]
+
+# 一次取回tbody.list的行并按表头映射成字典，limit为0时取全部行
+EXTRACT_ROWS_JS = """([fields, limit]) => {
+    let rows = Array.from(document.querySelectorAll('tbody.list tr'));
+    if (limit) rows = rows.slice(0, limit);
+    return rows.map(tr => {
+        const cells = Array.from(tr.querySelectorAll('td'), td => td.innerText.trim());
+        if (cells.length === 0) return null;
+        const record = {};
+        fields.forEach((field, i) => { record[field] = i < cells.length ? cells[i] : ''; });
+        return record;
+    });
+}"""
+
+
+def extract_flight_rows(page, limit=0):
+    """一次evaluate提取tbody.list中的行，返回字典列表"""
+    return [r for r in page.evaluate(EXTRACT_ROWS_JS, [FLIGHT_FIELDS, limit]) if r]
 
 
 def extract_flight_data(page):
@@ -259,51 +636,290 @@ def extract_flight_data(page):
         dict: 包含员工号、姓名、飞行经历、起落总数等信息
     """
     try:
-        # 等待表格加载
-        page.wait_for_timeout(1000)
-        
-        # 查找表格tbody
-        tbody = page.locator("tbody.list")
-        
-        # 获取第一行数据（通常只有一条记录）
-        first_row = tbody.locator("tr").first
-        
-        # 提取所有td单元格
-        cells = first_row.locator("td")
-        cell_count = cells.count()
-        
-        if cell_count == 0:
-            return None
+        # query_flight_record已等到表格刷新，不再固定等待
+        wait_ready(page, 1000)
         
-        # 按照表头顺序提取数据
-        data = {
-            "员工号": cells.nth(0).inner_text().strip() if cell_count > 0 else "",
-            "姓名": cells.nth(1).inner_text().strip() if cell_count > 1 else "",
-            "注册基地": cells.nth(2).inner_text().strip() if cell_count > 2 else "",
-            "运行基地": cells.nth(3).inner_text().strip() if cell_count > 3 else "",
-            "技术信息": cells.nth(4).inner_text().strip() if cell_count > 4 else "",
-            "开始日期": cells.nth(5).inner_text().strip() if cell_count > 5 else "",
-            "结束日期": cells.nth(6).inner_text().strip() if cell_count > 6 else "",
-            "飞行时间": cells.nth(7).inner_text().strip() if cell_count > 7 else "",
-            "飞行经历": cells.nth(8).inner_text().strip() if cell_count > 8 else "",
-            "航段数": cells.nth(9).inner_text().strip() if cell_count > 9 else "",
-            "夜航经历": cells.nth(10).inner_text().strip() if cell_count > 10 else "",
-            "左座经历": cells.nth(11).inner_text().strip() if cell_count > 11 else "",
-            "右座经历": cells.nth(12).inner_text().strip() if cell_count > 12 else "",
-            "模拟机": cells.nth(13).inner_text().strip() if cell_count > 13 else "",
-            "本场时间": cells.nth(14).inner_text().strip() if cell_count > 14 else "",
-            "起落总数": cells.nth(15).inner_text().strip() if cell_count > 15 else "",
-            "航线起落": cells.nth(16).inner_text().strip() if cell_count > 16 else "",
-            "本场起落": cells.nth(17).inner_text().strip() if cell_count > 17 else "",
-            "人工飞行时间": cells.nth(18).inner_text().strip() if cell_count > 18 else "",
-        }
-        
-        return data
+        # 第一行数据（通常只有一条记录）
+        rows = extract_flight_rows(page, limit=1)
+        return rows[0] if rows else None
     except Exception as e:
         print(c_warn(f"提取数据失败: {e}"))
         return None
 
 
+def check_emp_id(data, emp_id):
+    """确认结果是本次查询的员工，表格没刷新时拿到的是上一条的数据"""
+    if data and str(data.get("员工号", "")).strip() != str(emp_id):
+        raise RuntimeError(f"查询结果的员工号{data.get('员工号')}与查询的{emp_id}不符")
+    return data
+
+
+# 接口查询：先通过页面查一次，记下"查询"按钮发出的请求，之后用登录态直接重放该请求
+ENGINE_UI = "ui"
+ENGINE_HTTP = "http"
+
+# 请求模板中的占位符
+EMP_TOKEN = "__EMP_ID__"
+START_TOKEN = "__START_DATE__"
+END_TOKEN = "__END_DATE__"
+
+# 最多用几条有数据的记录学习查询接口：各列都对上唯一的JSON字段才改用接口，否则退回页面查询
+LEARN_RECORDS = 5
+
+# 重放请求时不复制的请求头，cookie由context.request自动带上
+SKIP_HEADERS = {"cookie", "content-length", "host", "connection", "accept-encoding"}
+
+
+class _TableParser(HTMLParser):
+    """提取HTML中tbody.list的单元格文字"""
+    
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self._depth = 0
+        self._cell = None
+    
+    def handle_starttag(self, tag, attrs):
+        if tag == "tbody" and "list" in (dict(attrs).get("class") or "").split():
+            self._depth += 1
+        elif self._depth and tag == "tr":
+            self.rows.append([])
+        elif self._depth and tag == "td" and self.rows:
+            self._cell = []
+    
+    def handle_endtag(self, tag):
+        if tag == "tbody" and self._depth:
+            self._depth -= 1
+        elif tag == "td" and self._cell is not None:
+            self.rows[-1].append(" ".join("".join(self._cell).split()))
+            self._cell = None
+    
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+def date_variants(date_str):
+    """YYYY/MM/DD在请求中可能出现的写法，返回{格式名: 写法}"""
+    year, month, day = date_str.split('/')
+    return {
+        "slash": f"{year}/{month}/{day}",
+        "slash_quoted": f"{year}%2F{month}%2F{day}",
+        "dash": f"{year}-{month}-{day}",
+        "compact": f"{year}{month}{day}",
+    }
+
+
+def _param_value_re(value):
+    """value作为参数值出现的位置：前面是=、:或引号，后面是&、引号、逗号、括号、空白或结尾"""
+    return re.compile(r'(?:(?<=[=:"\'])|(?<=:\s))' + re.escape(value) + r'(?=["\'&,}\]\s]|$)')
+
+
+def _templatize(text, emp_id, start_value, end_value):
+    """把请求中的员工号和日期替换成占位符，员工号只替换整个参数值，不动其他参数里碰巧相同的数字"""
+    if start_value == end_value:
+        # 起止日期相同时，按出现顺序区分开始和结束
+        text = text.replace(start_value, START_TOKEN, 1).replace(start_value, END_TOKEN, 1)
+    else:
+        text = text.replace(start_value, START_TOKEN).replace(end_value, END_TOKEN)
+    return _param_value_re(str(emp_id)).sub(EMP_TOKEN, text)
+
+
+def _number_text(value):
+    """JSON值转成页面上显示的文字"""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _find_json_rows(data):
+    """在JSON响应中找到第一个由对象组成的非空列表"""
+    if isinstance(data, list) and data and all(isinstance(x, dict) for x in data):
+        return data
+    if isinstance(data, dict):
+        data = list(data.values())
+    if not isinstance(data, list):
+        return None
+    for item in data:
+        rows = _find_json_rows(item)
+        if rows:
+            return rows
+    return None
+
+
+def parse_query_response(body, field_map=None):
+    """把查询响应解析成extract_flight_data同格式的字典列表
+    
+    Args:
+        body: 响应文本(JSON或含tbody.list的HTML)
+        field_map: JSON响应的 列名->JSON字段 映射，None表示按HTML表格解析
+    """
+    if field_map is not None:
+        rows = _find_json_rows(json.loads(body)) or []
+        return [{f: _number_text(row.get(field_map.get(f))) for f in FLIGHT_FIELDS} for row in rows]
+    parser = _TableParser()
+    parser.feed(body)
+    return [{f: cells[i] if i < len(cells) else "" for i, f in enumerate(FLIGHT_FIELDS)}
+            for cells in parser.rows if cells]
+
+
+def _learn_field_map(row, data, candidates=None):
+    """对照页面结果，找出每一列对应的JSON字段
+    
+    空列也要对上；candidates是之前几条记录留下的各列候选字段，和这一条取交集后就地更新。
+    几列的值相同时先定下只有一个候选字段的列，再排除已用的字段。
+    有列找不到字段或者排除后仍有多个候选时返回None
+    """
+    if candidates is None:
+        candidates = {}
+    for field in FLIGHT_FIELDS:
+        keys = {key for key, v in row.items() if _number_text(v) == data.get(field, "")}
+        candidates[field] = candidates[field] & keys if field in candidates else keys
+    candidates = dict(candidates)
+    field_map = {}
+    while candidates:
+        solved = {field: next(iter(keys)) for field, keys in candidates.items() if len(keys) == 1}
+        if not solved or len(set(solved.values())) < len(solved):
+            return None
+        field_map.update(solved)
+        used = set(solved.values())
+        candidates = {field: keys - used for field, keys in candidates.items() if field not in solved}
+    return field_map
+
+
+def make_query_template(request, data, emp_id, start_date, end_date, seen=None):
+    """根据页面查询时捕获的请求和页面结果生成请求模板，无法识别时返回None
+    
+    seen: 之前学习时各请求的各列候选字段 {(方法, URL模板): {列: 候选字段}}，就地更新
+    """
+    body = request.post_data or ""
+    for fmt, start_value in date_variants(start_date).items():
+        end_value = date_variants(end_date)[fmt]
+        text = request.url + "\n" + body
+        if str(emp_id) not in text or start_value not in text or end_value not in text:
+            continue
+        template = {
+            "method": request.method,
+            "url": _templatize(request.url, emp_id, start_value, end_value),
+            "body": _templatize(body, emp_id, start_value, end_value) if body else None,
+            "headers": {k: v for k, v in request.all_headers().items()
+                        if not k.startswith(":") and k.lower() not in SKIP_HEADERS},
+            "date_format": fmt,
+            "fields": None,
+        }
+        if EMP_TOKEN not in template["url"] + (template["body"] or ""):
+            continue
+        response = request.response()
+        if response is None:
+            return None
+        text = response.text()
+        try:
+            rows = _find_json_rows(json.loads(text))
+        except ValueError:
+            rows = None
+        if rows:
+            candidates = {} if seen is None else seen.setdefault((template["method"], template["url"]), {})
+            template["fields"] = _learn_field_map(rows[0], data, candidates)
+            if template["fields"] is None:
+                return None
+        # 整行和页面结果逐列一致才用接口，否则退回页面查询
+        parsed = parse_query_response(text, template["fields"])
+        if not parsed or any(parsed[0][f] != data.get(f, "") for f in FLIGHT_FIELDS):
+            return None
+        return template
+    return None
+
+
+def learn_query_template(page, emp_id, start_date, end_date, clear_first=False, seen=None):
+    """通过页面查询一次并学习查询请求，返回(页面结果, 请求模板或None)"""
+    captured = []
+    
+    def on_request(request):
+        if request.resource_type in ("xhr", "fetch", "document"):
+            captured.append(request)
+    
+    page.on("request", on_request)
+    try:
+        query_flight_record(page, emp_id, start_date, end_date, clear_first=clear_first)
+    finally:
+        page.remove_listener("request", on_request)
+    data = check_emp_id(extract_flight_data(page), emp_id)
+    if not data:
+        return data, None
+    for request in reversed(captured):
+        template = make_query_template(request, data, emp_id, start_date, end_date, seen)
+        if template:
+            return data, template
+    return data, None
+
+
+def http_query(context, template, emp_id, start_date, end_date):
+    """按请求模板直接请求查询接口，返回extract_flight_data同格式的字典"""
+    fmt = template["date_format"]
+    
+    def fill(text):
+        return (text.replace(EMP_TOKEN, str(emp_id))
+                .replace(START_TOKEN, date_variants(start_date)[fmt])
+                .replace(END_TOKEN, date_variants(end_date)[fmt]))
+    
+    response = context.request.fetch(
+        fill(template["url"]),
+        method=template["method"],
+        headers=template["headers"],
+        data=fill(template["body"]) if template["body"] else None,
+    )
+    if not response.ok:
+        raise RuntimeError(f"接口查询失败: HTTP {response.status}")
+    rows = parse_query_response(response.text(), template["fields"])
+    return check_emp_id(rows[0] if rows else None, emp_id)
+
+
+def query_record(page, engine, record, clear_first=False, timings=None):
+    """按所选查询方式查询一条记录
+    
+    Args:
+        page: playwright页面对象
+        engine: {"name": ENGINE_UI或ENGINE_HTTP, "template": 请求模板, "cache": 结果缓存,
+                 "learning": 学习查询接口的进度(按需创建)}
+        record: 解析后的记录
+        clear_first: 页面查询时是否先清空表单
+        timings: 各步骤耗时(毫秒)写入这个字典
+    
+    Returns:
+        dict: extract_flight_data同格式的数据
+    """
+    if timings is None:
+        timings = {}
+    emp_id, start_date, end_date = record["员工号"], record["开始日期"], record["结束日期"]
+    start = time.perf_counter()
+    if engine["name"] == ENGINE_HTTP:
+        if engine["template"] is not None:
+            data = http_query(page.context, engine["template"], emp_id, start_date, end_date)
+            mark_step(timings, "接口查询", start)
+            return data
+        # 学习期间的结果都来自页面查询
+        learning = engine.get("learning") or {"records": 0, "seen": {}}
+        engine["learning"] = learning
+        data, template = learn_query_template(page, emp_id, start_date, end_date, clear_first, learning["seen"])
+        mark_step(timings, "识别接口", start)
+        if template:
+            engine["template"] = template
+            print(c_ok("已识别查询接口，后续记录直接请求接口"))
+        elif data:
+            learning["records"] += 1
+            if learning["records"] >= LEARN_RECORDS:
+                engine["name"] = ENGINE_UI
+                print(c_warn("未能识别查询接口，改用页面查询"))
+        return data
+    query_flight_record(page, emp_id, start_date, end_date, clear_first=clear_first, timings=timings)
+    start = time.perf_counter()
+    data = check_emp_id(extract_flight_data(page), emp_id)
+    mark_step(timings, "提取", start)
+    return data
+
+
 def whitelist_status(whitelist):
     """返回白名单状态文字"""
     if whitelist:
@@ -369,7 +985,512 @@ def print_failed_records(failed_records):
             print(c_warn(f"保存日志失败: {e}"))
 
 
-def batch_mode(page, whitelist):
+# 失败追踪：Playwright追踪按记录分段(含截图和页面快照)，内存里只留最近TRACE_WINDOW条记录的段，
+# 更早的段直接丢掉。记录失败时把留下的几段(失败的记录和它前面几条)合并成一个文件，
+# 用 playwright show-trace 文件名.zip 查看
+FAILURE_TRACE = os.environ.get("IEB_FAILURE_TRACE", "1") != "0"  # 环境变量IEB_FAILURE_TRACE=0可关闭
+TRACE_WINDOW = 3
+FAILURE_TRACE_DIR = "failure_traces"
+TRACERS = {}  # id(浏览器上下文) -> 追踪状态
+
+
+def failure_tracer(context):
+    """取得上下文的失败追踪，第一次调用时开始追踪；关闭或无法开启时返回None"""
+    if not FAILURE_TRACE:
+        return None
+    key = id(context)
+    if key not in TRACERS:
+        try:
+            context.tracing.start(screenshots=True, snapshots=True)
+            context.tracing.start_chunk()
+            TRACERS[key] = {"context": context, "window": deque(maxlen=TRACE_WINDOW),
+                            "dir": tempfile.mkdtemp(prefix="ieb_trace_")}
+        except Exception as e:
+            print(c_warn(f"无法开启失败追踪: {e}"))
+            TRACERS[key] = None
+    return TRACERS[key]
+
+
+def merge_trace_chunks(chunks, path):
+    """把几段追踪合并成一个文件：每段的trace.*改名为 序号-trace.*，resources/下的资源只写一份"""
+    written = set()
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as out:
+        for n, data in enumerate(chunks):
+            with zipfile.ZipFile(io.BytesIO(data)) as chunk:
+                for name in chunk.namelist():
+                    target = f"{n}-{name}" if name.startswith("trace.") else name
+                    if target in written:
+                        continue
+                    written.add(target)
+                    out.writestr(target, chunk.read(name))
+
+
+def trace_checkpoint(tracer, record, reason):
+    """一条记录处理完后调用：这条记录的段放进窗口，失败时保存窗口里的几段并返回文件路径"""
+    if tracer is None:
+        return None
+    tracing = tracer["context"].tracing
+    path = None
+    try:
+        chunk_path = os.path.join(tracer["dir"], "chunk.zip")
+        tracing.stop_chunk(path=chunk_path)
+        with open(chunk_path, "rb") as f:
+            tracer["window"].append(f.read())  # 窗口满时最早的一段自动丢掉
+        os.remove(chunk_path)
+        if reason:
+            os.makedirs(FAILURE_TRACE_DIR, exist_ok=True)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            path = os.path.abspath(os.path.join(FAILURE_TRACE_DIR, f"{timestamp}_{record['员工号']}.zip"))
+            merge_trace_chunks(tracer["window"], path)
+            tracer["window"].clear()
+        tracing.start_chunk()
+    except Exception as e:
+        print(c_warn(f"保存失败追踪出错: {e}"))
+    return path
+
+
+def trace_result(tracer, record, reason):
+    """记录处理结果：失败时保存追踪，返回附上追踪文件路径的失败原因"""
+    path = trace_checkpoint(tracer, record, reason)
+    if not path:
+        return reason
+    print(c_warn(f"失败前的操作已保存: {path}"))
+    return f"{reason} (追踪: {path})"
+
+
+def stop_failure_trace(context):
+    """结束上下文的追踪，未保存的段直接丢弃"""
+    tracer = TRACERS.pop(id(context), None)
+    if tracer is None:
+        return
+    try:
+        context.tracing.stop()
+    except Exception:
+        pass
+    shutil.rmtree(tracer["dir"], ignore_errors=True)
+
+
+# 查询结果缓存：按(员工号, 开始日期, 结束日期)保存整行数据，命中时不再查询
+CACHE_FILE = "flight_cache.sqlite3"
+CACHE_TTL = 24 * 3600      # 缓存有效期(秒)，0表示不使用缓存
+CACHE_MAX_ROWS = 50000     # 超过后按写入时间淘汰最旧的记录
+
+
+def open_cache(path=CACHE_FILE):
+    """打开结果缓存，失败时返回None"""
+    if CACHE_TTL <= 0:
+        return None
+    try:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("""CREATE TABLE IF NOT EXISTS flight_cache (
+            emp_id TEXT, start_date TEXT, end_date TEXT, data TEXT, created REAL,
+            PRIMARY KEY (emp_id, start_date, end_date))""")
+        conn.execute("CREATE INDEX IF NOT EXISTS flight_cache_created ON flight_cache (created)")
+        conn.execute("DELETE FROM flight_cache WHERE created < ?", (time.time() - CACHE_TTL,))
+        conn.commit()
+    except sqlite3.Error as e:
+        print(c_warn(f"打开缓存失败,本次不使用缓存: {e}"))
+        return None
+    # 并发查询时多个线程共用连接
+    return {"conn": conn, "lock": threading.Lock(), "hit": 0, "miss": 0, "puts": 0}
+
+
+def cache_key(record):
+    """缓存键"""
+    return (record["员工号"], record["开始日期"], record["结束日期"])
+
+
+def cache_get(cache, record):
+    """读取缓存，未命中或已过期返回None"""
+    with cache["lock"]:
+        row = cache["conn"].execute(
+            "SELECT data FROM flight_cache WHERE emp_id = ? AND start_date = ? AND end_date = ? AND created >= ?",
+            (*cache_key(record), time.time() - CACHE_TTL)).fetchone()
+        if row:
+            cache["hit"] += 1
+            return json.loads(row[0])
+        cache["miss"] += 1
+        return None
+
+
+def cache_put(cache, record, data):
+    """写入缓存，每100次写入检查一次容量"""
+    with cache["lock"]:
+        conn = cache["conn"]
+        conn.execute("INSERT OR REPLACE INTO flight_cache VALUES (?, ?, ?, ?, ?)",
+                     (*cache_key(record), json.dumps(data, ensure_ascii=False), time.time()))
+        cache["puts"] += 1
+        if cache["puts"] % 100 == 0:
+            count = conn.execute("SELECT COUNT(*) FROM flight_cache").fetchone()[0]
+            if count > CACHE_MAX_ROWS:
+                conn.execute("""DELETE FROM flight_cache WHERE rowid IN (
+                    SELECT rowid FROM flight_cache ORDER BY created LIMIT ?)""", (count - CACHE_MAX_ROWS,))
+        conn.commit()
+
+
+def cache_report(cache, before=None):
+    """返回缓存命中率文字，before为开始前的(hit, miss)"""
+    hit, miss = cache["hit"], cache["miss"]
+    if before:
+        hit, miss = hit - before[0], miss - before[1]
+    total = hit + miss
+    rate = hit / total * 100 if total else 0
+    return f"缓存命中{hit}/{total}({rate:.0f}%)"
+
+
+def cached_query(page, engine, record, clear_first=False):
+    """先查缓存，未命中时按所选查询方式查询并写入缓存，各步骤耗时写入耗时追踪"""
+    timings = {}
+    cache = engine.get("cache")
+    if cache:
+        start = time.perf_counter()
+        data = cache_get(cache, record)
+        mark_step(timings, "缓存", start)
+        if data is not None:
+            trace_record(record, timings, "缓存命中")
+            return data
+    degraded = READY_DEGRADED.get(id(page), 0)
+    try:
+        data = check_emp_id(query_record(page, engine, record, clear_first, timings), record["员工号"])
+    except Exception as e:
+        trace_record(record, timings, f"失败: {e}")
+        raise
+    trace_record(record, timings, "成功" if data else "无数据")
+    # 有等待没等到信号时结果不一定可靠，只用这一次，不写入缓存
+    if cache and data and READY_DEGRADED.get(id(page), 0) == degraded:
+        cache_put(cache, record, data)
+    return data
+
+
+# 资源拦截：门户页面的图片、字体、统计脚本等脚本用不到，拦下后页面加载和networkidle更快
+# 只为这些资源的URL注册路由，查询、员工信息等接口请求不经过Python
+BLOCK_ASSETS = True
+BLOCKED_URL_PATTERNS = [
+    re.compile(r"\.(?:png|jpe?g|gif|svg|ico|webp|bmp|woff2?|ttf|otf|eot|mp3|mp4|webm|ogg|wav)(?:[?#]|$)", re.I),
+    re.compile(r"//[^/]*(?:google-analytics\.com|googletagmanager\.com|hm\.baidu\.com|cnzz\.com)/"),
+]
+ASSET_ALLOWLIST = ("My97DatePicker",)  # 需要保留的资源URL片段：日期控件的皮肤图片
+# 每个页面第一次进入时不拦截，记下用时和会被拦截的资源大小作为对照，保存下来以后的运行直接用
+ASSET_BASELINE_FILE = "asset_baseline.json"
+ASSET_SIZES = {}      # 未拦截时下载过的资源 URL -> 字节数，用来估算拦截省下的流量
+NAV_BASELINE = {}     # 未拦截时各页面的加载用时(秒)
+ASSET_FILTERS = {}    # id(浏览器上下文) -> 拦截计数
+ASSET_LOCK = threading.Lock()
+
+
+def is_blocked_asset(url):
+    """是否为需要拦截的资源"""
+    if any(part in url for part in ASSET_ALLOWLIST):
+        return False
+    return any(pattern.search(url) for pattern in BLOCKED_URL_PATTERNS)
+
+
+def load_asset_baseline():
+    """读取以前保存的各页面未拦截时的用时和资源大小"""
+    try:
+        with open(ASSET_BASELINE_FILE, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return
+    with ASSET_LOCK:
+        NAV_BASELINE.update(data.get("nav", {}))
+        ASSET_SIZES.update(data.get("sizes", {}))
+
+
+def save_asset_baseline():
+    """保存各页面未拦截时的用时和资源大小"""
+    with ASSET_LOCK:
+        text = json.dumps({"nav": NAV_BASELINE, "sizes": ASSET_SIZES}, ensure_ascii=False)
+    try:
+        with open(ASSET_BASELINE_FILE, "w", encoding="utf-8") as f:
+            f.write(text)
+    except OSError as e:
+        print(c_warn(f"保存资源拦截对照失败: {e}"))
+
+
+def block_assets(context):
+    """给上下文装上资源拦截，登录完成后调用，扫码页的二维码不受影响"""
+    if not BLOCK_ASSETS or id(context) in ASSET_FILTERS:
+        return
+    if not NAV_BASELINE:
+        load_asset_baseline()
+    stats = {"blocked": 0, "bytes": 0, "unknown": 0, "learning": False}
+    
+    def handle(route):
+        request = route.request
+        # 白名单里的资源、测对照的那次导航照常加载
+        if stats["learning"] or not is_blocked_asset(request.url):
+            route.continue_()
+            return
+        size = ASSET_SIZES.get(request.url)
+        stats["blocked"] += 1
+        if size is None:
+            stats["unknown"] += 1
+        else:
+            stats["bytes"] += size
+        route.abort()
+    
+    for pattern in BLOCKED_URL_PATTERNS:
+        context.route(pattern, handle)
+    ASSET_FILTERS[id(context)] = stats
+
+
+def learn_asset_sizes(page):
+    """记录未拦截时会被拦截的资源大小，返回监听函数，用完后remove_listener"""
+    def on_response(response):
+        if is_blocked_asset(response.url):
+            length = response.headers.get("content-length")
+            if length and length.isdigit():
+                with ASSET_LOCK:
+                    ASSET_SIZES[response.url] = int(length)
+    
+    page.on("response", on_response)
+    return on_response
+
+
+def start_navigation(page, label):
+    """导航开始时的时间和拦截计数；这个页面还没有对照时这次不拦截，测一次对照"""
+    stats = ASSET_FILTERS.get(id(page.context))
+    listener = None
+    if stats is not None and label not in NAV_BASELINE:
+        stats["learning"] = True
+        listener = learn_asset_sizes(page)
+    return time.perf_counter(), dict(stats) if stats else None, listener
+
+
+def navigation_report(page, label, nav):
+    """输出一次导航的用时和拦截省下的请求、流量"""
+    start, before, listener = nav
+    elapsed = time.perf_counter() - start
+    stats = ASSET_FILTERS.get(id(page.context))
+    if not stats or before is None:
+        return
+    if listener:
+        page.remove_listener("response", listener)
+        stats["learning"] = False
+        with ASSET_LOCK:
+            NAV_BASELINE.setdefault(label, round(elapsed, 2))
+        save_asset_baseline()
+        print(c_info(f"{label}: 用时{elapsed:.1f}s(第一次进入没有拦截，记为对照)"))
+        return
+    blocked = stats["blocked"] - before["blocked"]
+    saved_kb = (stats["bytes"] - before["bytes"]) / 1024
+    unknown = stats["unknown"] - before["unknown"]
+    text = f"{label}: 用时{elapsed:.1f}s"
+    if label in NAV_BASELINE:
+        text += f"(不拦截时{NAV_BASELINE[label]:.1f}s,省{NAV_BASELINE[label] - elapsed:.1f}s)"
+    text += f" 拦截{blocked}个请求 约{saved_kb:.0f}KB"
+    if unknown:
+        text += f"(另有{unknown}个大小未知)"
+    print(c_info(text))
+
+
+PORTAL_URL = os.environ.get("IEB_PORTAL_URL", "https://ieb.csair.com")  # 门户地址，可用环境变量指向模拟门户
+SESSION_FILE = "ieb_session.json"  # 扫码登录后保存的登录状态，下次启动时复用
+
+
+def new_session_context(browser):
+    """创建浏览器上下文，有保存的登录状态时带上"""
+    if os.path.exists(SESSION_FILE):
+        try:
+            return browser.new_context(storage_state=SESSION_FILE)
+        except Exception as e:
+            print(c_warn(f"读取登录状态失败: {e}"))
+    return browser.new_context()
+
+
+def session_valid(page):
+    """打开门户首页，没有被跳转到登录页说明登录状态有效"""
+    if not os.path.exists(SESSION_FILE):
+        return False
+    try:
+        page.goto(f"{PORTAL_URL}/index/index")
+        page.wait_for_load_state("networkidle")
+        return "/login" not in page.url and page.locator("#scanLogin").count() == 0
+    except Exception:
+        return False
+
+
+def save_session(context):
+    """保存登录状态，文件里是登录Cookie，只允许当前用户读写"""
+    try:
+        state = context.storage_state()
+        fd = os.open(SESSION_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        # 文件原来就存在时os.open不改权限
+        os.chmod(SESSION_FILE, 0o600)
+    except Exception as e:
+        print(c_warn(f"保存登录状态失败: {e}"))
+
+
+def login(page):
+    """扫码登录"""
+    try:
+        page.goto(f"{PORTAL_URL}/login")
+        page.wait_for_load_state("networkidle")
+        page.locator("#scanLogin").wait_for()
+        page.locator("#scanLogin").click()
+        print(c_info("请扫码登录..."))
+        page.wait_for_url("**/index/**")
+        page.wait_for_load_state("networkidle")
+        print(c_ok("登录成功"))
+    except Exception as e:
+        print(c_err(f"自动登录失败: {e}"))
+        print(c_warn("请手动完成登录"))
+        input(c_hint("登录完成后按回车继续..."))
+
+
+def open_session_page(browser):
+    """用保存的登录状态创建上下文和页面"""
+    context = new_session_context(browser)
+    context.set_default_timeout(0)
+    return context, context.new_page()
+
+
+def launch_session(pw, launch, bootstrap=True):
+    """启动浏览器并恢复登录状态，返回(browser, context, page)
+    
+    登录状态失效时扫码登录并保存；无界面运行时先开一个有窗口的浏览器扫码，
+    保存后再用新的登录状态无界面启动。bootstrap为False时不扫码，返回None
+    """
+    browser = pw.chromium.launch(**launch)
+    context, page = open_session_page(browser)
+    if session_valid(page):
+        print(c_ok("登录状态有效,跳过扫码登录"))
+        return browser, context, page
+    if not bootstrap:
+        browser.close()
+        return None
+    if not launch.get("headless"):
+        login(page)
+        save_session(context)
+        return browser, context, page
+    browser.close()
+    print(c_warn("登录状态失效,打开浏览器窗口扫码登录一次,之后无界面运行"))
+    browser = pw.chromium.launch(**{**launch, "headless": False})
+    context, page = open_session_page(browser)
+    login(page)
+    save_session(context)
+    browser.close()
+    browser = pw.chromium.launch(**launch)
+    context, page = open_session_page(browser)
+    return browser, context, page
+
+
+def goto_flight_report(page):
+    """从门户首页进入飞行经历查询页面，并选中"按员工号查询\""""
+    nav = start_navigation(page, "首页")
+    page.goto(f"{PORTAL_URL}/index/index")
+    page.wait_for_load_state("networkidle")
+    navigation_report(page, "首页", nav)
+    page.get_by_text("统计应用").nth(1).wait_for()
+    page.get_by_text("统计应用").nth(1).click()
+    page.get_by_role("link", name="综合报表").wait_for()
+    page.get_by_role("link", name="综合报表").click()
+    page.get_by_role("link", name="飞行经历").wait_for()
+    nav = start_navigation(page, "飞行经历页")
+    page.get_by_role("link", name="飞行经历").click()
+    page.wait_for_load_state("networkidle")
+    navigation_report(page, "飞行经历页", nav)
+    # 进入页面后立即选择"按员工号查询"单选按钮
+    wait_ready(page, 500, lambda: page.get_by_role("radio").nth(2).wait_for(timeout=READY_TIMEOUT))
+    page.get_by_role("radio").nth(2).check()
+    wait_ready(page, 300)
+
+
+# 多页并发：Playwright同步接口不能跨线程使用，每个线程启动自己的浏览器，
+# 并用主窗口的登录状态(storage_state)创建上下文，无需重复扫码
+def drain_tasks(worker_id, page, engine, tasks, results, tracer, clear_first=False):
+    """从任务队列不断取记录查询，直到队列取空"""
+    count = 0
+    while True:
+        try:
+            index, record = tasks.get_nowait()
+        except queue.Empty:
+            break
+        try:
+            data = cached_query(page, engine, record, clear_first=(clear_first or count > 0))
+            trace_checkpoint(tracer, record, None)
+            results[index] = (record, data, None)
+            detail = f"飞行经历: {data['飞行经历']} | 起落总数: {data['起落总数']}" if data else "无数据"
+            print(c_ok(f"[页面{worker_id}] {format_record(record)} - {detail}"))
+        except Exception as e:
+            results[index] = (record, None, trace_result(tracer, record, str(e)))
+            print(c_err(f"[页面{worker_id}] {format_record(record)} - 失败: {e}"))
+        count += 1
+
+
+def pool_worker(worker_id, storage_state, pool, engine, tasks, results):
+    """并发查询线程：启动自己的浏览器，进入飞行经历页面后从任务队列取记录查询"""
+    pw = sync_playwright().start()
+    browser = None
+    context = None
+    try:
+        browser = pw.chromium.launch(**pool["launch"])
+        context = browser.new_context(storage_state=storage_state)
+        context.set_default_timeout(pool["timeout"])
+        tracer = failure_tracer(context)
+        block_assets(context)
+        page = context.new_page()
+        goto_flight_report(page)
+        # 接口模板已识别时直接共用，否则每个页面各自识别
+        drain_tasks(worker_id, page, dict(engine, learning=None), tasks, results, tracer)
+    except Exception as e:
+        print(c_err(f"[页面{worker_id}] 启动失败: {e}"))
+    finally:
+        if context:
+            stop_failure_trace(context)
+            ASSET_FILTERS.pop(id(context), None)
+        if browser:
+            browser.close()
+        pw.stop()
+
+
+def run_pool(page, records, engine, pool):
+    """多页并发查询，返回按输入顺序排列的[(record, data, 错误信息)]
+    
+    已经在飞行经历页面的主页面算第1个页面，在当前线程里查询；其余页面各开一个线程和浏览器
+    """
+    tasks = queue.Queue()
+    for index, record in enumerate(records):
+        tasks.put((index, record))
+    results = [None] * len(records)
+    storage_state = page.context.storage_state()
+    workers = min(pool["workers"], len(records))
+    print(c_info(f"启动{workers}个页面并发查询..."))
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=pool_worker, args=(n, storage_state, pool, engine, tasks, results), daemon=True)
+        for n in range(2, workers + 1)
+    ]
+    for t in threads:
+        t.start()
+    # 其他页面还在启动时主页面已经开始查询
+    drain_tasks(1, page, engine, tasks, results, failure_tracer(page.context), clear_first=True)
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    print(c_info(f"并发查询用时{elapsed:.1f}s,平均每条{elapsed / len(records):.2f}s"))
+    # 所有页面都启动失败时剩下的记录没有结果
+    return [r if r else (records[i], None, "未执行") for i, r in enumerate(results)]
+
+
+def print_pool_results(results):
+    """按输入顺序打印并发查询结果，返回失败记录"""
+    failed_records = []
+    for i, (record, data, error) in enumerate(results, 1):
+        if error:
+            print(c_err(f"{i}. {format_record(record)} - 失败: {error}"))
+            failed_records.append((record, error))
+        elif data:
+            print(c_ok(f"{i}. {format_record(record)} - 飞行经历: {data['飞行经历']} | 起落总数: {data['起落总数']}"))
+        else:
+            print(c_warn(f"{i}. {format_record(record)} - 无数据"))
+    return failed_records
+
+
+def batch_mode(page, whitelist, engine, pool):
     """批量模式"""
     failed_records = []
     while True:
@@ -394,20 +1515,32 @@ def batch_mode(page, whitelist):
             return
         if confirm != 'y':
             continue
+        start_run()
+        cache_before = (engine["cache"]["hit"], engine["cache"]["miss"]) if engine["cache"] else None
+        if pool["workers"] > 1:
+            failed_records.extend(print_pool_results(run_pool(page, records, engine, pool)))
+            print(c_info(step_report()))
+            print(c_ok("批量处理完成"))
+            if engine["cache"]:
+                print(c_info(cache_report(engine["cache"], cache_before)))
+            print_failed_records(failed_records)
+            return
+        run_before = dict(READY_STATS)
+        tracer = failure_tracer(page.context)
         i = 0
         while i < len(records):
             record = records[i]
             print(f"{c_info(f'[{i+1}/{len(records)}]')} 查询: {format_record(record)}")
             try:
                 # 第一条不清空表单，后续的清空
-                query_flight_record(page, record["员工号"], record["开始日期"], record["结束日期"], clear_first=(i > 0))
-                
-                # 提取数据
-                data = extract_flight_data(page)
+                ready_before = dict(READY_STATS)
+                data = cached_query(page, engine, record, clear_first=(i > 0))
+                trace_checkpoint(tracer, record, None)
                 if data:
                     print(c_ok(f"查询完成 - 飞行经历: {data['飞行经历']} | 起落总数: {data['起落总数']}"))
                 else:
                     print(c_ok("查询完成"))
+                print(c_info(ready_report(ready_before)))
                 
                 cmd = input(c_hint("回车继续查询,s跳过,b返回主菜单: ")).strip().lower()
                 if cmd == 'b':
@@ -419,27 +1552,32 @@ def batch_mode(page, whitelist):
             except Exception as e:
                 beep_error()
                 print(c_err(f"失败: {e}"))
+                reason = trace_result(tracer, record, str(e))
                 while True:
                     cmd = input(c_hint("s跳过,r重试,b返回主菜单: ")).strip().lower()
                     if cmd == 'b':
-                        failed_records.append((record, str(e)))
+                        failed_records.append((record, reason))
                         print_failed_records(failed_records)
                         return
                     if cmd == 'r':
                         break
                     if cmd == 's':
-                        failed_records.append((record, str(e)))
+                        failed_records.append((record, reason))
                         i += 1
                         break
                     print(c_warn("无效输入，请输入s/r/b"))
                 if cmd == 'r':
                     continue
         print(c_ok("批量处理完成"))
+        print(c_info(f"就绪等待: {ready_report(run_before, len(records))}"))
+        print(c_info(step_report()))
+        if engine["cache"]:
+            print(c_info(cache_report(engine["cache"], cache_before)))
         print_failed_records(failed_records)
         return
 
 
-def manual_mode(page, whitelist):
+def manual_mode(page, whitelist, engine):
     """手动模式"""
     query_count = 0  # 记录查询次数
     while True:
@@ -463,15 +1601,14 @@ def manual_mode(page, whitelist):
             print(f"查询: {format_record(record)}")
             try:
                 # 第一次查询不清空，后续清空
-                query_flight_record(page, record["员工号"], record["开始日期"], record["结束日期"], clear_first=(query_count > 0))
+                ready_before = dict(READY_STATS)
+                data = cached_query(page, engine, record, clear_first=(query_count > 0))
                 query_count += 1
-                
-                # 提取数据
-                data = extract_flight_data(page)
                 if data:
                     print(c_ok(f"查询完成 - 飞行经历: {data['飞行经历']} | 起落总数: {data['起落总数']}"))
                 else:
                     print(c_ok("查询完成"))
+                print(c_info(ready_report(ready_before)))
                 break
             except Exception as e:
                 beep_error()
@@ -488,7 +1625,7 @@ def manual_mode(page, whitelist):
                 break
 
 
-def excel_mode(page, whitelist):
+def excel_mode(page, whitelist, engine, pool):
     """Excel导入模式"""
     if not HAS_OPENPYXL:
         print(c_err("未安装openpyxl库，请运行: pip install openpyxl"))
@@ -527,21 +1664,33 @@ def excel_mode(page, whitelist):
             return
         if confirm != 'y':
             continue
+        start_run()
         
+        cache_before = (engine["cache"]["hit"], engine["cache"]["miss"]) if engine["cache"] else None
+        if pool["workers"] > 1:
+            failed_records.extend(print_pool_results(run_pool(page, records, engine, pool)))
+            print(c_info(step_report()))
+            print(c_ok("Excel导入完成"))
+            if engine["cache"]:
+                print(c_info(cache_report(engine["cache"], cache_before)))
+            print_failed_records(failed_records)
+            return
+        run_before = dict(READY_STATS)
+        tracer = failure_tracer(page.context)
         i = 0
         while i < len(records):
             record = records[i]
             print(f"{c_info(f'[{i+1}/{len(records)}]')} 查询: {format_record(record)}")
             try:
                 # 第一条不清空表单，后续的清空
-                query_flight_record(page, record["员工号"], record["开始日期"], record["结束日期"], clear_first=(i > 0))
-                
-                # 提取数据
-                data = extract_flight_data(page)
+                ready_before = dict(READY_STATS)
+                data = cached_query(page, engine, record, clear_first=(i > 0))
+                trace_checkpoint(tracer, record, None)
                 if data:
                     print(c_ok(f"查询完成 - 飞行经历: {data['飞行经历']} | 起落总数: {data['起落总数']}"))
                 else:
                     print(c_ok("查询完成"))
+                print(c_info(ready_report(ready_before)))
                 
                 cmd = input(c_hint("回车继续查询,s跳过,b返回主菜单: ")).strip().lower()
                 if cmd == 'b':
@@ -553,27 +1702,205 @@ def excel_mode(page, whitelist):
             except Exception as e:
                 beep_error()
                 print(c_err(f"失败: {e}"))
+                reason = trace_result(tracer, record, str(e))
                 while True:
                     cmd = input(c_hint("s跳过,r重试,b返回主菜单: ")).strip().lower()
                     if cmd == 'b':
-                        failed_records.append((record, str(e)))
+                        failed_records.append((record, reason))
                         print_failed_records(failed_records)
                         return
                     if cmd == 'r':
                         break
                     if cmd == 's':
-                        failed_records.append((record, str(e)))
+                        failed_records.append((record, reason))
                         i += 1
                         break
                     print(c_warn("无效输入，请输入s/r/b"))
                 if cmd == 'r':
                     continue
         print(c_ok("Excel导入完成"))
+        print(c_info(f"就绪等待: {ready_report(run_before, len(records))}"))
+        print(c_info(step_report()))
+        if engine["cache"]:
+            print(c_info(cache_report(engine["cache"], cache_before)))
         print_failed_records(failed_records)
         return
 
 
+# 无人值守运行：python app.py --input 数据.xlsx [--whitelist 白名单.txt] [--mode http] [--workers 3]
+# 参数也可以写在文件里(每行一个，如 --input=数据.xlsx)，用 python app.py @参数文件 引用
+EXIT_OK = 0        # 全部查询成功
+EXIT_FAILED = 1    # 有记录查询失败或无法解析
+EXIT_USAGE = 2     # 参数或输入文件有误(与argparse相同)
+EXIT_LOGIN = 3     # 登录状态失效，无人值守时无法扫码
+EXIT_ERROR = 4     # 浏览器启动、页面导航等运行错误
+
+
+def parse_args(argv=None):
+    """解析命令行参数，不带参数时进入交互菜单"""
+    parser = argparse.ArgumentParser(
+        description="飞行经历起落数查询助手。不带参数时进入交互菜单，指定--input后无人值守运行",
+        fromfile_prefix_chars="@",
+    )
+    parser.add_argument("--input", help="数据文件：.xlsx，或粘贴格式的文本文件")
+    parser.add_argument("--whitelist", help="员工号白名单文本文件")
+    parser.add_argument("--mode", choices=[ENGINE_UI, ENGINE_HTTP], default=ENGINE_UI,
+                        help="查询方式：ui页面查询，http接口查询(默认ui)")
+    parser.add_argument("--output", help="结果CSV路径(默认results_时间.csv)")
+    parser.add_argument("--workers", type=int, default=1, help="并发页数(默认1)")
+    parser.add_argument("--browser", help="浏览器路径")
+    parser.add_argument("--headless", action="store_true",
+                        help="无界面运行，登录状态失效时先打开窗口扫码一次")
+    parser.add_argument("--timeout", type=int, default=60,
+                        help="每个页面操作的最长等待秒数，0为不限(默认60)")
+    args = parser.parse_args(argv)
+    if not args.input and (argv if argv is not None else sys.argv[1:]):
+        parser.error("无人值守运行需要指定--input")
+    if args.workers < 1:
+        parser.error("--workers至少为1")
+    return args
+
+
+# 文本文件依次尝试的编码：UTF-8(可带BOM)，中文Windows记事本默认存的GBK(用兼容它的GB18030解码)
+TEXT_ENCODINGS = ("utf-8-sig", "gb18030")
+
+
+def read_text_file(filepath):
+    """按TEXT_ENCODINGS依次尝试读取文本文件，都不对时抛出最后一个UnicodeDecodeError"""
+    with open(filepath, "rb") as f:
+        data = f.read()
+    for encoding in TEXT_ENCODINGS:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError as e:
+            error = e
+    raise error
+
+
+def load_records(filepath, whitelist=None):
+    """按扩展名读取Excel或粘贴格式的文本文件，返回(records, errors)"""
+    if filepath.lower().endswith((".xlsx", ".xlsm")):
+        return parse_excel_file(filepath, whitelist)
+    return parse_batch_input(read_text_file(filepath), whitelist)
+
+
+def run_serial(page, records, engine):
+    """单页依次查询，不询问，返回按输入顺序排列的[(record, data, 错误信息)]"""
+    results = []
+    tracer = failure_tracer(page.context)
+    for i, record in enumerate(records):
+        print(f"{c_info(f'[{i+1}/{len(records)}]')} 查询: {format_record(record)}")
+        try:
+            data = cached_query(page, engine, record, clear_first=(i > 0))
+            trace_checkpoint(tracer, record, None)
+            results.append((record, data, None))
+        except Exception as e:
+            results.append((record, None, trace_result(tracer, record, str(e))))
+    return results
+
+
+def write_results_csv(filepath, results):
+    """把查询结果写成CSV，Excel可以直接打开"""
+    columns = ["员工号", "姓名", "开始日期", "结束日期"]
+    fields = [f for f in FLIGHT_FIELDS if f not in columns]
+    with open(filepath, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns + fields + ["结果"])
+        for record, data, error in results:
+            status = f"失败: {error}" if error else ("成功" if data else "无数据")
+            writer.writerow([record.get(c) or "" for c in columns]
+                            + [(data or {}).get(f, "") for f in fields] + [status])
+
+
+def run_cli(args):
+    """无人值守运行：读取输入文件查询全部记录并写出结果，返回退出码"""
+    whitelist = None
+    if args.whitelist:
+        try:
+            whitelist = parse_whitelist(read_text_file(args.whitelist))
+        except OSError as e:
+            print(c_err(f"读取白名单失败: {e}"))
+            return EXIT_USAGE
+        except UnicodeDecodeError:
+            print(c_err(f"读取白名单失败: {args.whitelist} 不是UTF-8或GBK编码的文本文件"))
+            return EXIT_USAGE
+        if not whitelist:
+            print(c_err("白名单中没有有效员工号"))
+            return EXIT_USAGE
+        print(c_ok(f"白名单:{len(whitelist)}人"))
+    
+    if not os.path.exists(args.input):
+        print(c_err(f"文件不存在: {args.input}"))
+        return EXIT_USAGE
+    try:
+        records, errors = load_records(args.input, whitelist)
+    except OSError as e:
+        print(c_err(f"读取输入文件失败: {e}"))
+        return EXIT_USAGE
+    except UnicodeDecodeError:
+        print(c_err(f"读取输入文件失败: {args.input} 不是UTF-8或GBK编码的文本文件，请另存为其中一种"))
+        return EXIT_USAGE
+    for err in errors:
+        print(c_err(err))
+    if not records:
+        print(c_warn("没有可处理的记录"))
+        return EXIT_FAILED if errors else EXIT_OK
+    print(c_ok(f"共{len(records)}条有效数据"))
+    
+    engine = {"name": args.mode, "template": None, "cache": open_cache()}
+    pool = {
+        "workers": args.workers,
+        "launch": {"headless": args.headless, "executable_path": args.browser},
+        "timeout": args.timeout * 1000,
+    }
+    pw = sync_playwright().start()
+    browser = None
+    try:
+        # 有人在终端前时允许弹出窗口扫码，计划任务中直接返回
+        session = launch_session(pw, pool["launch"], bootstrap=sys.stdin.isatty())
+        if session is None:
+            print(c_err("登录状态失效,无人值守运行无法扫码,请先交互运行一次完成登录"))
+            return EXIT_LOGIN
+        browser, context, page = session
+        context.set_default_timeout(pool["timeout"])
+        block_assets(context)
+        goto_flight_report(page)
+        start_run()
+        if pool["workers"] > 1:
+            results = run_pool(page, records, engine, pool)
+        else:
+            results = run_serial(page, records, engine)
+        save_session(context)
+    except Exception as e:
+        print(c_err(f"运行出错: {e}"))
+        return EXIT_ERROR
+    finally:
+        if browser:
+            browser.close()
+        pw.stop()
+        if engine["cache"]:
+            engine["cache"]["conn"].close()
+    
+    failed_records = print_pool_results(results)
+    if engine["cache"]:
+        print(c_info(cache_report(engine["cache"])))
+    print(c_info(step_report()))
+    output = args.output or f"results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    try:
+        write_results_csv(output, results)
+        print(c_ok(f"结果已保存: {os.path.abspath(output)}"))
+    except OSError as e:
+        print(c_err(f"保存结果失败: {e}"))
+        return EXIT_ERROR
+    print_failed_records(failed_records)
+    return EXIT_FAILED if failed_records or errors else EXIT_OK
+
+
 def main():
+    args = parse_args()
+    if args.input:
+        sys.exit(run_cli(args))
+    
     print(c_info("飞行经历起落数查询助手"))
     
     browser_path = input(c_hint("浏览器路径(回车用默认): ")).strip() or None
@@ -581,6 +1908,24 @@ def main():
         print(c_ok(f"使用指定浏览器: {browser_path}"))
     else:
         print(c_ok("使用默认浏览器"))
+    headless = input(c_hint("无界面运行?(y/n,回车默认n): ")).strip().lower() == 'y'
+    if headless:
+        print(c_ok("无界面运行,登录状态失效时会先打开窗口扫码"))
+    
+    engine_choice = input(c_hint("查询方式(1页面 2接口,回车默认页面): ")).strip()
+    engine = {"name": ENGINE_HTTP if engine_choice == '2' else ENGINE_UI, "template": None, "cache": open_cache()}
+    if engine["name"] == ENGINE_HTTP:
+        print(c_ok("使用接口查询(首条记录通过页面查询以识别接口)"))
+    else:
+        print(c_ok("使用页面查询"))
+    
+    workers = input(c_hint("批量/Excel并发页数(回车默认1): ")).strip()
+    pool = {
+        "workers": int(workers) if workers.isdigit() and int(workers) > 0 else 1,
+        "launch": {"headless": headless, "executable_path": browser_path},
+        "timeout": 0,
+    }
+    print(c_ok(f"并发页数: {pool['workers']}"))
     
     whitelist = None
     use_wl = input(c_hint("是否预设白名单?(y/n): ")).strip().lower()
@@ -590,43 +1935,20 @@ def main():
         print(c_ok("不设置白名单,处理所有员工"))
     
     pw = sync_playwright().start()
-    browser = pw.chromium.launch(headless=False, executable_path=browser_path)
-    context = browser.new_context()
-    context.set_default_timeout(0)
-    page = context.new_page()
-    
-    try:
-        page.goto("https://ieb.csair.com/login")
-        page.wait_for_load_state("networkidle")
-        page.locator("#scanLogin").wait_for()
-        page.locator("#scanLogin").click()
-        print(c_info("请扫码登录..."))
-        page.wait_for_url("**/index/**")
-        page.wait_for_load_state("networkidle")
-        print(c_ok("登录成功"))
-    except Exception as e:
-        print(c_err(f"自动登录失败: {e}"))
-        print(c_warn("请手动完成登录"))
-        input(c_hint("登录完成后按回车继续..."))
+    browser, context, page = launch_session(pw, pool["launch"])
+    block_assets(context)
     
     try:
         print(c_info("正在进入飞行经历查询页面..."))
-        page.goto("https://ieb.csair.com/index/index")
-        page.wait_for_load_state("networkidle")
-        page.get_by_text("统计应用").nth(1).wait_for()
-        page.get_by_text("统计应用").nth(1).click()
-        page.get_by_role("link", name="综合报表").wait_for()
-        page.get_by_role("link", name="综合报表").click()
-        page.get_by_role("link", name="飞行经历").wait_for()
-        page.get_by_role("link", name="飞行经历").click()
-        page.wait_for_load_state("networkidle")
-        # 进入页面后立即选择"按员工号查询"单选按钮
-        page.wait_for_timeout(500)
-        page.get_by_role("radio").nth(2).check()
-        page.wait_for_timeout(300)
+        goto_flight_report(page)
         print(c_ok("已进入飞行经历查询页面"))
     except Exception as e:
         print(c_err(f"自动导航失败: {e}"))
+        if headless:
+            print(c_warn("无界面运行时无法手动操作,请不选无界面运行重新启动"))
+            browser.close()
+            pw.stop()
+            return
         print(c_warn("请手动进入飞行经历查询页面"))
         input(c_hint("准备好后按回车继续..."))
     
@@ -635,11 +1957,11 @@ def main():
         print(f"{whitelist_status(whitelist)} | {c_hint('1批量 2手动 3Excel导入 w设白名单 c清白名单 q退出')}")
         cmd = input(c_hint("选择: ")).strip().lower()
         if cmd == '1':
-            batch_mode(page, whitelist)
+            batch_mode(page, whitelist, engine, pool)
         elif cmd == '2':
-            manual_mode(page, whitelist)
+            manual_mode(page, whitelist, engine)
         elif cmd == '3':
-            excel_mode(page, whitelist)
+            excel_mode(page, whitelist, engine, pool)
         elif cmd == 'w':
             new_wl = set_whitelist()
             if new_wl is not None:
@@ -650,6 +1972,10 @@ def main():
         elif cmd == 'q':
             break
     
+    save_session(context)
+    if engine["cache"]:
+        print(c_info(f"本次运行{cache_report(engine['cache'])}"))
+        engine["cache"]["conn"].close()
     print(c_info("\n程序结束，浏览器保持打开状态"))
     print(c_hint("按回车关闭程序..."))
     input()
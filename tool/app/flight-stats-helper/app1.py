@@ -2,9 +2,11 @@
 
 import re
 import os
+import tempfile
+import time
 from datetime import datetime
 from colorama import init, Fore, Style
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
 from openpyxl import load_workbook
 
 init()
@@ -107,14 +109,16 @@ def read_multiline(prompt, confirm_key='ok', cancel_key='c'):
     return '\n'.join(lines)
 
 
-def parse_excel_file(filepath: str) -> tuple:
-    """解析Excel文件，返回(records, errors)"""
-    records = []
-    errors = []
-    
+def iter_excel_records(filepath: str, errors: list = None):
+    """逐行读取Excel文件，产出校验通过的记录，错误追加到errors"""
+    if errors is None:
+        errors = []
+    # 只读模式逐行读取，不载入单元格样式，读大文件时工作簿本身占的内存小得多
+    wb = load_workbook(filepath, read_only=True, data_only=True)
     try:
-        wb = load_workbook(filepath, data_only=True)
         ws = wb.active
+        # 有些软件导出的文件尺寸信息不准，按实际存在的行读取
+        ws.reset_dimensions()
         
         for row_num, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
             if not row or not any(row):
@@ -144,39 +148,185 @@ def parse_excel_file(filepath: str) -> tuple:
                 errors.append(f"第{row_num}行: 日期格式错误")
                 continue
             
-            records.append({
+            yield {
                 "员工号": emp_id,
                 "姓名": name,
                 "开始日期": start,
                 "结束日期": end or start,
                 "行号": row_num
-            })
-        
+            }
+    finally:
         wb.close()
+
+
+def parse_excel_file(filepath: str) -> tuple:
+    """解析Excel文件，返回(records, errors)
+    
+    记录仍收集成列表：开始前要显示全部记录并确认，结果写回同一个文件，
+    边读边写在Windows上会因文件被占用而保存失败
+    """
+    records = []
+    errors = []
+    
+    try:
+        for record in iter_excel_records(filepath, errors):
+            records.append(record)
     except Exception as e:
         errors.append(f"读取Excel失败: {e}")
     
     return records, errors
 
 
-def write_to_excel(filepath: str, row_num: int, flight_exp: str, landing_count: str):
-    """实时写入Excel"""
+# Excel写回：工作簿只打开一次，写入先缓存，满FLUSH_ROWS行或FLUSH_SECONDS秒保存一次
+FLUSH_ROWS = 20
+FLUSH_SECONDS = 10
+
+
+def open_excel_writer(filepath: str) -> dict:
+    """打开要写回的Excel文件"""
+    wb = load_workbook(filepath)
+    # rows: 上次保存后写入的行号 -> 是否查询成功; saved: 已保存的查询成功行数
+    return {"path": filepath, "wb": wb, "ws": wb.active, "rows": {}, "saved": 0, "last_flush": time.time()}
+
+
+def flush_excel(writer: dict) -> bool:
+    """保存缓存的写入：先存临时文件再替换原文件，保存中途出错不会损坏原文件
+    
+    保存成功后缓存的行才算写入；保存失败时这些行留在缓存里，下次保存时一起重试
+    """
+    if not writer["rows"]:
+        return True
+    path = os.path.abspath(writer["path"])
+    fd, tmp_path = tempfile.mkstemp(prefix=".~", suffix=".xlsx", dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        writer["wb"].save(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        print(c_err(f"保存Excel失败: {e}，{len(writer['rows'])}行结果尚未保存"))
+        return False
+    saved = sum(writer["rows"].values())
+    writer["saved"] += saved
+    writer["rows"].clear()
+    writer["last_flush"] = time.time()
+    if saved:
+        print(c_ok(f"已写入Excel: {saved}条结果"))
+    return True
+
+
+def write_to_excel(writer: dict, row_num: int, flight_exp: str, landing_count: str, success: bool = False):
+    """写入Excel(缓存后批量保存)，success表示这一行是查询成功的结果，保存后才计入成功数"""
     try:
-        wb = load_workbook(filepath)
-        ws = wb.active
-        
         # 写入飞行经历（E列）和起落总数（F列）
-        ws.cell(row=row_num, column=5, value=flight_exp)
-        ws.cell(row=row_num, column=6, value=landing_count)
+        writer["ws"].cell(row=row_num, column=5, value=flight_exp)
+        writer["ws"].cell(row=row_num, column=6, value=landing_count)
+        writer["rows"][row_num] = success
         
-        wb.save(filepath)
-        wb.close()
+        if len(writer["rows"]) >= FLUSH_ROWS or time.time() - writer["last_flush"] >= FLUSH_SECONDS:
+            flush_excel(writer)
         return True
     except Exception as e:
         print(c_err(f"写入Excel失败: {e}"))
         return False
 
 
+def close_excel_writer(writer: dict) -> bool:
+    """保存剩余写入并关闭工作簿，返回是否全部保存"""
+    saved = flush_excel(writer)
+    writer["wb"].close()
+    return saved
+
+
+# 就绪等待：默认等待页面的真实信号（日期控件弹出/关闭、查询请求返回、tbody.list刷新）
+# 页面异常时可把FIXED_SLEEP改为True，退回原来的固定等待
+FIXED_SLEEP = False
+READY_TIMEOUT = 10000   # 等待信号的最长时间(毫秒)，超时按已就绪继续（查询请求和表格刷新超时则该条失败）
+RENDER_TIMEOUT = 3000   # 查询请求返回后等待表格刷新的最长时间(毫秒)
+
+# fixed: 原固定等待应耗时, waited: 实际等待耗时(毫秒)
+READY_STATS = {"fixed": 0, "waited": 0.0}
+
+TABLE_CHANGED_JS = """(before) => {
+    const tbody = document.querySelector('tbody.list');
+    return !!tbody && tbody.innerHTML !== before;
+}"""
+
+
+def wait_ready(page, legacy_ms, signal=None, required=False):
+    """等待页面就绪
+    
+    Args:
+        page: playwright页面对象
+        legacy_ms: 原来的固定等待毫秒数，FIXED_SLEEP时照此等待，并用于统计节省时间
+        signal: 等待真实信号的函数；None表示后续操作自带等待，无需额外等待
+        required: 为True时信号超时直接抛出，不按已就绪继续
+    """
+    start = time.perf_counter()
+    try:
+        if FIXED_SLEEP:
+            page.wait_for_timeout(legacy_ms)
+        elif signal is not None:
+            try:
+                signal()
+            except PlaywrightTimeoutError:
+                if required:
+                    raise
+    finally:
+        READY_STATS["fixed"] += legacy_ms
+        READY_STATS["waited"] += (time.perf_counter() - start) * 1000
+
+
+def ready_report(before, count=1):
+    """返回就绪等待统计文字，before为开始前的READY_STATS副本"""
+    fixed = READY_STATS["fixed"] - before["fixed"]
+    waited = READY_STATS["waited"] - before["waited"]
+    saved = (fixed - waited) / max(count, 1) / 1000
+    if count > 1:
+        return f"平均每条等待{waited / count / 1000:.1f}s,比固定等待节省{saved:.1f}s"
+    return f"等待{waited / 1000:.1f}s,比固定等待节省{saved:.1f}s"
+
+
+def date_picker(page):
+    """日期控件所在的iframe"""
+    return page.locator("iframe").nth(2)
+
+
+def open_date_picker(page, selector, clear_first=False):
+    """点击日期输入框并等待日期控件弹出"""
+    def picker_shown():
+        date_picker(page).wait_for(state="visible", timeout=READY_TIMEOUT)
+    
+    page.locator(selector).click()
+    wait_ready(page, 200, picker_shown)
+    if clear_first:
+        # 第二次及以后有时需要再点一次才会弹出日期选择器
+        if FIXED_SLEEP or not date_picker(page).is_visible():
+            page.locator(selector).click()
+        wait_ready(page, 200, picker_shown)
+
+
+def table_snapshot(page):
+    """tbody.list当前内容，用于判断查询结果是否已刷新"""
+    return page.evaluate("""() => {
+        const tbody = document.querySelector('tbody.list');
+        return tbody ? tbody.innerHTML : null;
+    }""")
+
+
+def is_query_response(response, emp_id):
+    """查询按钮发出的请求：URL或请求体里带着本次查询员工号的xhr/fetch请求"""
+    request = response.request
+    if request.resource_type not in ("xhr", "fetch"):
+        return False
+    try:
+        body = request.post_data or ""
+    except (UnicodeDecodeError, ValueError):
+        body = ""
+    return str(emp_id) in request.url or str(emp_id) in body
+
+
 def fill_date(page, date_str):
     """填写日期到日期选择器"""
     parts = date_str.split('/')
@@ -195,28 +345,125 @@ def fill_date(page, date_str):
     month_cn = month_map.get(month, month)
     day_str = str(int(day))  # 去掉前导0
     
+    frame = date_picker(page).content_frame
+    
     # 等待iframe加载
-    page.wait_for_timeout(300)
+    wait_ready(page, 300, lambda: frame.get_by_role("textbox").nth(1).wait_for(timeout=READY_TIMEOUT))
     
+    # 以下每步点击都会自动等待目标单元格出现，不再额外等待
     # 1. 点击年份输入框
-    page.locator("iframe").nth(2).content_frame.get_by_role("textbox").nth(1).click()
-    page.wait_for_timeout(100)
+    frame.get_by_role("textbox").nth(1).click()
+    wait_ready(page, 100)
     
     # 2. 选择年份
-    page.locator("iframe").nth(2).content_frame.get_by_role("cell", name=year).click()
-    page.wait_for_timeout(100)
+    frame.get_by_role("cell", name=year).click()
+    wait_ready(page, 100)
     
     # 3. 点击月份输入框
-    page.locator("iframe").nth(2).content_frame.get_by_role("textbox").first.click()
-    page.wait_for_timeout(100)
+    frame.get_by_role("textbox").first.click()
+    wait_ready(page, 100)
     
     # 4. 选择月份
-    page.locator("iframe").nth(2).content_frame.get_by_role("cell", name=month_cn).click()
-    page.wait_for_timeout(100)
+    frame.get_by_role("cell", name=month_cn).click()
+    wait_ready(page, 100)
     
     # 5. 选择日期 - 使用first选择第一个匹配的日期（避免匹配到15、25等）
-    page.locator("iframe").nth(2).content_frame.get_by_role("cell", name=day_str).first.click()
-    page.wait_for_timeout(100)
+    frame.get_by_role("cell", name=day_str).first.click()
+    # 选中日期后控件会关闭
+    wait_ready(page, 100, lambda: date_picker(page).wait_for(state="hidden", timeout=READY_TIMEOUT))
+
+
+# 日期按日期控件的格式直接写入输入框并触发页面监听的事件，写入未生效时这一次改走日期控件逐级点选。
+# 是否真正进入查询条件以查询请求里的日期为准，见query_flight_record；
+# 连续FAST_DATE_MISSES条都没进入时，本次运行不再直接写入
+FAST_DATE = True
+FAST_DATE_MISSES = 3
+# sep: 控件没写dateFmt时用的分隔符(My97DatePicker默认yyyy-MM-dd)，点选一次后按控件写出的值更新
+# misses: 直接写入的日期连续没进入查询请求的条数, off: 本次运行已停用直接写入
+DATE_INPUT = {"sep": "-", "misses": 0, "off": False}
+
+WRITE_DATE_JS = """async ([selector, year, month, day, sep]) => {
+    const input = document.querySelector(selector);
+    if (!input) return null;
+    // My97DatePicker的格式写在onclick/onfocus的dateFmt里
+    const config = (input.getAttribute('onclick') || '') + (input.getAttribute('onfocus') || '');
+    const match = config.match(/dateFmt\\s*:\\s*['"]([^'"]+)['"]/);
+    const value = (match ? match[1] : ['yyyy', 'MM', 'dd'].join(sep))
+        .replace('yyyy', year).replace('MM', month).replace('dd', day);
+    // 带时间或单字母月日的格式不直接写入
+    if (/[A-Za-z]/.test(value)) return null;
+    input.value = value;
+    for (const type of ['input', 'change', 'blur']) {
+        input.dispatchEvent(new Event(type, { bubbles: true }));
+    }
+    // 等页面处理完事件后再确认值没有被控件改回
+    await new Promise(resolve => setTimeout(resolve, 0));
+    return input.value === value ? value : null;
+}"""
+
+READ_VALUE_JS = "(selector) => { const input = document.querySelector(selector); return input ? input.value : ''; }"
+
+
+def write_date(page, selector, date_str):
+    """直接写入日期输入框，返回写入的值，未生效时返回None"""
+    parts = date_str.split('/')
+    if len(parts) != 3:
+        return None
+    return page.evaluate(WRITE_DATE_JS, [selector, *parts, DATE_INPUT["sep"]])
+
+
+def set_date(page, selector, date_str, clear_first=False, fast=None):
+    """填写日期：优先直接写入，未生效时这一次退回日期控件点选
+    
+    Args:
+        fast: 是否尝试直接写入，None时按FAST_DATE和本次运行是否已停用
+    
+    Returns:
+        bool: 是否用的直接写入
+    """
+    if fast is None:
+        fast = FAST_DATE and not DATE_INPUT["off"]
+    if fast and write_date(page, selector, date_str):
+        return True
+    open_date_picker(page, selector, clear_first)
+    fill_date(page, date_str)
+    # 记下控件实际写出的分隔符，下次直接写入时照用
+    value = page.evaluate(READ_VALUE_JS, selector)
+    for sep in "/-":
+        if sep in value:
+            DATE_INPUT["sep"] = sep
+    return False
+
+
+def date_variants(date_str):
+    """YYYY/MM/DD在请求中可能出现的写法，返回{格式名: 写法}"""
+    year, month, day = date_str.split('/')
+    return {
+        "slash": f"{year}/{month}/{day}",
+        "slash_quoted": f"{year}%2F{month}%2F{day}",
+        "dash": f"{year}-{month}-{day}",
+        "compact": f"{year}{month}{day}",
+    }
+
+
+def request_has_dates(request, start_date, end_date):
+    """查询请求里是否带着这两个日期(任一种写法)"""
+    try:
+        text = request.url + "\n" + (request.post_data or "")
+    except (UnicodeDecodeError, ValueError):
+        text = request.url
+    return all(any(v in text for v in date_variants(d).values()) for d in (start_date, end_date))
+
+
+def fast_date_checked(ok):
+    """记录一次直接写入的日期是否进入了查询请求，连续FAST_DATE_MISSES次没进入时停用直接写入"""
+    if ok:
+        DATE_INPUT["misses"] = 0
+        return
+    DATE_INPUT["misses"] += 1
+    if DATE_INPUT["misses"] >= FAST_DATE_MISSES and not DATE_INPUT["off"]:
+        DATE_INPUT["off"] = True
+        print(c_warn(f"连续{FAST_DATE_MISSES}条直接写入的日期没有进入查询条件，本次运行改用日期控件点选"))
 
 
 def query_flight_record(page, emp_id, start_date, end_date, clear_first=False):
@@ -224,72 +471,110 @@ def query_flight_record(page, emp_id, start_date, end_date, clear_first=False):
     # 填写员工号
     emp_input = page.get_by_placeholder("员工号或姓名")
     emp_input.click()
-    page.wait_for_timeout(100)
+    wait_ready(page, 100)
     
     if clear_first:
         # 第二次及以后：先清空再输入
         emp_input.fill("")
-        page.wait_for_timeout(100)
+        wait_ready(page, 100)
     
     # 用type模拟逐字输入
     emp_input.type(str(emp_id), delay=50)
-    page.wait_for_timeout(300)
-    
-    # 填写开始日期 - 多次点击确保触发日期选择器
-    page.locator("#flyTimeExperience_beginDate").click()
-    page.wait_for_timeout(200)
-    if clear_first:
-        # 第二次及以后需要多点几次
-        page.locator("#flyTimeExperience_beginDate").click()
-        page.wait_for_timeout(200)
-    fill_date(page, start_date)
-    
-    # 填写结束日期 - 多次点击确保触发日期选择器
-    page.locator("#flyTimeExperience_endDate").click()
-    page.wait_for_timeout(200)
-    if clear_first:
-        # 第二次及以后需要多点几次
-        page.locator("#flyTimeExperience_endDate").click()
-        page.wait_for_timeout(200)
-    fill_date(page, end_date)
-    
-    # 点击查询
-    page.wait_for_timeout(300)
-    page.get_by_role("button", name="查询").click()
-    page.wait_for_timeout(1500)
+    wait_ready(page, 300)
+    
+    # 填写开始日期和结束日期
+    fast = set_date(page, "#flyTimeExperience_beginDate", start_date, clear_first)
+    fast = set_date(page, "#flyTimeExperience_endDate", end_date, clear_first) or fast
+    
+    wait_ready(page, 300)
+    request = submit_query(page, emp_id)
+    if fast and request is not None:
+        verified = request_has_dates(request, start_date, end_date)
+        fast_date_checked(verified)
+        if not verified:
+            # 直接写入的日期没有进入页面的查询条件，这一条改用日期控件点选后重新查询
+            print(c_warn("日期直接写入未进入查询条件，改用日期控件点选后重新查询"))
+            set_date(page, "#flyTimeExperience_beginDate", start_date, True, fast=False)
+            set_date(page, "#flyTimeExperience_endDate", end_date, True, fast=False)
+            submit_query(page, emp_id)
+
+
+def submit_query(page, emp_id):
+    """点击查询，等待本员工的查询请求返回且tbody.list刷新，返回查询请求(FIXED_SLEEP时为None)
+    
+    超时抛出PlaywrightTimeoutError
+    """
+    before = table_snapshot(page)
+    button = page.get_by_role("button", name="查询")
+    sent = []
+    
+    def query_done():
+        with page.expect_response(lambda r: is_query_response(r, emp_id), timeout=READY_TIMEOUT) as response_info:
+            button.click()
+        sent.append(response_info.value.request)
+        try:
+            page.wait_for_function(TABLE_CHANGED_JS, arg=before, timeout=RENDER_TIMEOUT)
+        except PlaywrightTimeoutError:
+            # 上一条和这一条都没有数据时表格不会变；表格里还有数据说明没刷新，不能当作这一条的结果
+            if extract_flight_rows(page, limit=1):
+                raise
+    
+    if FIXED_SLEEP:
+        button.click()
+    wait_ready(page, 1500, query_done, required=True)
+    return sent[0] if sent else None
+
+
+# 飞行经历表格列，按表头顺序
+FLIGHT_FIELDS = [
+    "员工号", "姓名", "注册基地", "运行基地", "技术信息", "开始日期", "结束日期",
+    "飞行时间", "飞行经历", "航段数", "夜航经历", "左座经历", "右座经历",
+    "模拟机", "本场时间", "起落总数", "航线起落", "本场起落", "人工飞行时间",
+]
+
+# 一次取回tbody.list的行并按表头映射成字典，limit为0时取全部行
+EXTRACT_ROWS_JS = """([fields, limit]) => {
+    let rows = Array.from(document.querySelectorAll('tbody.list tr'));
+    if (limit) rows = rows.slice(0, limit);
+    return rows.map(tr => {
+        const cells = Array.from(tr.querySelectorAll('td'), td => td.innerText.trim());
+        if (cells.length === 0) return null;
+        const record = {};
+        fields.forEach((field, i) => { record[field] = i < cells.length ? cells[i] : ''; });
+        return record;
+    });
+}"""
+
+
+def extract_flight_rows(page, limit=0):
+    """一次evaluate提取tbody.list中的行，返回字典列表"""
+    return [r for r in page.evaluate(EXTRACT_ROWS_JS, [FLIGHT_FIELDS, limit]) if r]
 
 
 def extract_flight_data(page):
     """提取飞行经历数据"""
     try:
-        # 等待表格加载
-        page.wait_for_timeout(1000)
-        
-        # 查找表格tbody
-        tbody = page.locator("tbody.list")
-        
-        # 获取第一行数据
-        first_row = tbody.locator("tr").first
-        
-        # 提取所有td单元格
-        cells = first_row.locator("td")
-        cell_count = cells.count()
-        
-        if cell_count == 0:
-            return None
+        # query_flight_record已等到表格刷新，不再固定等待
+        wait_ready(page, 1000)
         
-        # 提取飞行经历（第9列）和起落总数（第16列）
-        data = {
-            "飞行经历": cells.nth(8).inner_text().strip() if cell_count > 8 else "",
-            "起落总数": cells.nth(15).inner_text().strip() if cell_count > 15 else "",
-        }
-        
-        return data
+        # 第一行数据（通常只有一条记录）
+        rows = extract_flight_rows(page, limit=1)
+        return rows[0] if rows else None
     except Exception as e:
         print(c_warn(f"提取数据失败: {e}"))
         return None
 
 
+def check_emp_id(data, emp_id):
+    """确认结果是本次查询的员工，表格没刷新时拿到的是上一条的数据"""
+    if data and str(data.get("员工号", "")).strip() != str(emp_id):
+        raise RuntimeError(f"查询结果的员工号{data.get('员工号')}与查询的{emp_id}不符")
+    return data
+
+
+PORTAL_URL = os.environ.get("IEB_PORTAL_URL", "https://ieb.csair.com")  # 门户地址，可用环境变量指向模拟门户
+
+
 def main():
     print(c_info("飞行经历起落数查询助手 - 批量模式"))
     
@@ -303,7 +588,7 @@ def main():
     
     try:
         # 登录
-        page.goto("https://ieb.csair.com/login")
+        page.goto(f"{PORTAL_URL}/login")
         page.wait_for_load_state("networkidle")
         page.locator("#scanLogin").wait_for()
         page.locator("#scanLogin").click()
@@ -319,7 +604,7 @@ def main():
     try:
         # 导航到飞行经历页面
         print(c_info("正在进入飞行经历查询页面..."))
-        page.goto("https://ieb.csair.com/index/index")
+        page.goto(f"{PORTAL_URL}/index/index")
         page.wait_for_load_state("networkidle")
         page.get_by_text("统计应用").nth(1).wait_for()
         page.get_by_text("统计应用").nth(1).click()
@@ -328,9 +613,9 @@ def main():
         page.get_by_role("link", name="飞行经历").wait_for()
         page.get_by_role("link", name="飞行经历").click()
         page.wait_for_load_state("networkidle")
-        page.wait_for_timeout(500)
+        wait_ready(page, 500, lambda: page.get_by_role("radio").nth(2).wait_for(timeout=READY_TIMEOUT))
         page.get_by_role("radio").nth(2).check()
-        page.wait_for_timeout(300)
+        wait_ready(page, 300)
         print(c_ok("已进入飞行经历查询页面"))
     except Exception as e:
         print(c_err(f"自动导航失败: {e}"))
@@ -421,43 +706,55 @@ def main():
     
     # 批量查询
     print(c_ok("开始批量查询"))
-    success_count = 0
-    fail_count = 0
+    run_before = dict(READY_STATS)
     
-    for i, record in enumerate(records):
-        name = record.get('姓名', '未知')
-        print(f"{c_info(f'[{i+1}/{len(records)}]')} 查询: {record['员工号']} {name} {record['开始日期']}~{record['结束日期']}")
-        
-        try:
-            # 查询
-            query_flight_record(page, record["员工号"], record["开始日期"], record["结束日期"], clear_first=(i > 0))
-            
-            # 提取数据
-            data = extract_flight_data(page)
+    try:
+        writer = open_excel_writer(output_file)
+    except Exception as e:
+        print(c_err(f"打开Excel失败: {e}"))
+        return
+    
+    try:
+        for i, record in enumerate(records):
+            name = record.get('姓名', '未知')
+            print(f"{c_info(f'[{i+1}/{len(records)}]')} 查询: {record['员工号']} {name} {record['开始日期']}~{record['结束日期']}")
             
-            if data and data.get('飞行经历') and data.get('起落总数'):
-                flight_exp = data['飞行经历']
-                landing_count = data['起落总数']
+            try:
+                # 查询
+                ready_before = dict(READY_STATS)
+                query_flight_record(page, record["员工号"], record["开始日期"], record["结束日期"], clear_first=(i > 0))
                 
-                # 实时写入Excel
-                if write_to_excel(output_file, record['行号'], flight_exp, landing_count):
-                    print(c_ok(f"✓ 飞行经历: {flight_exp} | 起落总数: {landing_count} | 已写入Excel"))
-                    success_count += 1
-                else:
-                    print(c_err(f"✗ 查询成功但写入失败"))
-                    fail_count += 1
-            else:
-                print(c_warn(f"✗ 未查询到数据"))
-                write_to_excel(output_file, record['行号'], "无数据", "无数据")
-                fail_count += 1
+                # 提取数据，员工号对不上时按查询失败处理，不写入上一条的结果
+                data = check_emp_id(extract_flight_data(page), record["员工号"])
+                print(c_info(ready_report(ready_before)))
                 
-        except Exception as e:
-            print(c_err(f"✗ 失败: {e}"))
-            write_to_excel(output_file, record['行号'], "查询失败", "查询失败")
-            fail_count += 1
-    
-    # 完成
+                if data and data.get('飞行经历') and data.get('起落总数'):
+                    flight_exp = data['飞行经历']
+                    landing_count = data['起落总数']
+                    
+                    # 写入Excel(缓存后批量保存，保存成功才计入成功数)
+                    if write_to_excel(writer, record['行号'], flight_exp, landing_count, success=True):
+                        print(c_ok(f"✓ 飞行经历: {flight_exp} | 起落总数: {landing_count}"))
+                    else:
+                        print(c_err(f"✗ 查询成功但写入失败"))
+                else:
+                    print(c_warn(f"✗ 未查询到数据"))
+                    write_to_excel(writer, record['行号'], "无数据", "无数据")
+                    
+            except Exception as e:
+                print(c_err(f"✗ 失败: {e}"))
+                write_to_excel(writer, record['行号'], "查询失败", "查询失败")
+    finally:
+        # 中途退出也保存已查询的结果
+        unsaved = sum(writer["rows"].values())
+        if not close_excel_writer(writer) and unsaved:
+            print(c_err(f"有{unsaved}条查询成功的结果没能保存到Excel"))
+    
+    # 完成：只有已保存到Excel的结果算成功
+    success_count = writer["saved"]
+    fail_count = len(records) - success_count
     print(c_ok(f"\n批量查询完成！成功: {success_count}, 失败: {fail_count}"))
+    print(c_info(f"就绪等待: {ready_report(run_before, len(records))}"))
     print(c_ok(f"结果已保存到: {os.path.abspath(output_file)}"))
     print(c_info("\n浏览器保持打开状态，可以手动查看结果"))
     print(c_hint("按回车关闭程序..."))
@@ -0,0 +1,272 @@
+# 端到端吞吐基准：启动模拟门户，用两个助手的无人值守命令行按各执行方式跑同样数量的记录
+# 用法: python bench_e2e.py [--records 50] [--workers 3] [--latency 200] [--jitter 100] [--compare 旧报告.json]
+# 报告写到 bench_reports/e2e_<提交号>.json(不提交到仓库)，不同提交的报告可以直接对比；要保留的基线用 --output baselines/e2e_<提交号>.json
+
+import argparse
+import csv
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+from mock_portal import HAS_OPENPYXL, SESSION_COOKIE, start_server
+
+try:
+    import psutil
+    HAS_PSUTIL = True
+except ImportError:
+    HAS_PSUTIL = False
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LOCK_APP = os.path.join(HERE, "..", "lock-entry-helper", "app.py")
+FLIGHT_APP = os.path.join(HERE, "..", "flight-stats-helper", "app.py")
+REPORT_DIR = os.path.join(HERE, "bench_reports")
+MEMORY_INTERVAL = 0.5  # 浏览器内存采样间隔(秒)
+
+# (助手, 执行方式, 脚本, 追踪文件, 命令行参数)；{workers}替换成并发页数
+SCENARIOS = [
+    ("锁班", "逐条", LOCK_APP, "lock_trace.jsonl", ["--mode", "fill"]),
+    ("锁班", "多页", LOCK_APP, "lock_trace.jsonl", ["--mode", "fill", "--workers", "{workers}"]),
+    ("锁班", "整批导入", LOCK_APP, "lock_trace.jsonl", ["--mode", "import"]),
+    ("飞行经历", "逐条", FLIGHT_APP, "flight_trace.jsonl", ["--mode", "ui"]),
+    ("飞行经历", "多页", FLIGHT_APP, "flight_trace.jsonl", ["--mode", "ui", "--workers", "{workers}"]),
+    ("飞行经历", "接口", FLIGHT_APP, "flight_trace.jsonl", ["--mode", "http"]),
+]
+
+
+def lock_input(n):
+    """n条锁班记录，每人一条，日期互不相连，不会被合并"""
+    lines = []
+    for i in range(n):
+        month, day = i % 12 + 1, i // 12 % 27 + 1
+        lines.append(f"{100000 + i * 7} 张三 ALV 2026-{month:02d}-{day:02d} 2026-{month:02d}-{day:02d}")
+    return "\n".join(lines) + "\n"
+
+
+def flight_input(n):
+    """n条飞行经历查询，每人一个月"""
+    return "".join(f"{100000 + i * 7} 张三 2026/{i % 12 + 1:02d}/01 2026/{i % 12 + 1:02d}/28\n" for i in range(n))
+
+
+def portal_session(url, path):
+    """在模拟门户登录并写出storage_state格式的登录状态，助手启动时直接复用"""
+    class NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args):
+            return None
+
+    opener = urllib.request.build_opener(NoRedirect)
+    try:
+        opener.open(f"{url}/mock/scan")
+        raise RuntimeError("模拟门户登录没有返回登录状态")
+    except urllib.error.HTTPError as e:
+        cookie = e.headers["Set-Cookie"].split(";", 1)[0]
+    token = cookie.split("=", 1)[1]
+    state = {
+        "cookies": [{"name": SESSION_COOKIE, "value": token, "domain": "127.0.0.1", "path": "/",
+                     "expires": -1, "httpOnly": True, "secure": False, "sameSite": "Lax"}],
+        "origins": [],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+
+
+def reset_portal(url):
+    urllib.request.urlopen(urllib.request.Request(f"{url}/mock/reset", data=b"", method="POST")).read()
+
+
+def watch_memory(pid, stop, peak):
+    """定时累加助手启动的浏览器进程的内存，记录峰值(字节)"""
+    try:
+        proc = psutil.Process(pid)
+    except psutil.Error:
+        return
+    while not stop.is_set():
+        total = 0
+        try:
+            for child in proc.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except psutil.Error:
+                    pass
+        except psutil.Error:
+            break
+        peak[0] = max(peak[0], total)
+        stop.wait(MEMORY_INTERVAL)
+
+
+def percentile(values, p):
+    """最近秩法求第p百分位数"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def read_latencies(path):
+    """读取追踪文件中每条记录的总耗时(毫秒)"""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["total_ms"] for line in f if line.strip()]
+
+
+def count_failed(path):
+    """结果CSV中不是"成功"的行数，没有结果文件时返回None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return sum(1 for row in csv.DictReader(f) if row["结果"] != "成功")
+
+
+def run_scenario(url, workdir, scenario, args):
+    helper, mode, script, trace_file, extra = scenario
+    os.makedirs(workdir)
+    input_path = os.path.join(workdir, "input.txt")
+    with open(input_path, "w", encoding="utf-8") as f:
+        f.write(lock_input(args.records) if script == LOCK_APP else flight_input(args.records))
+    portal_session(url, os.path.join(workdir, "ieb_session.json"))
+    reset_portal(url)
+    output = os.path.join(workdir, "results.csv")
+    cmd = [sys.executable, os.path.abspath(script), "--input", input_path, "--output", output,
+           "--headless", "--timeout", str(args.timeout)]
+    cmd += [a.replace("{workers}", str(args.workers)) for a in extra]
+    if args.browser:
+        cmd += ["--browser", args.browser]
+    env = dict(os.environ, IEB_PORTAL_URL=url, PYTHONIOENCODING="utf-8")
+
+    peak = [0]
+    stop = threading.Event()
+    with open(os.path.join(workdir, "output.log"), "w", encoding="utf-8") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdin=subprocess.DEVNULL,
+                                stdout=log, stderr=subprocess.STDOUT)
+        watcher = None
+        if HAS_PSUTIL:
+            watcher = threading.Thread(target=watch_memory, args=(proc.pid, stop, peak), daemon=True)
+            watcher.start()
+        exit_code = proc.wait()
+        wall = time.perf_counter() - start
+        stop.set()
+        if watcher:
+            watcher.join()
+
+    latencies = read_latencies(os.path.join(workdir, trace_file))
+    result = {
+        "helper": helper,
+        "mode": mode,
+        "records": args.records,
+        "exit_code": exit_code,
+        "failed": count_failed(output),
+        "wall_s": round(wall, 2),
+        "records_per_min": round(args.records / wall * 60, 1),
+        "latency_ms": {f"p{p}": round(percentile(latencies, p), 1) for p in (50, 95, 99)} if latencies else None,
+        "browser_peak_mb": round(peak[0] / 1024 / 1024, 1) if HAS_PSUTIL else None,
+    }
+    # 没有结果文件说明助手没跑完，用时和内存没有意义，附上输出末尾便于排查
+    if exit_code not in (0, 1) or result["failed"] is None:
+        result["records_per_min"] = result["browser_peak_mb"] = None
+        with open(os.path.join(workdir, "output.log"), encoding="utf-8") as f:
+            result["log_tail"] = f.read()[-2000:]
+    return result
+
+
+def git_commit():
+    """当前提交号，有未提交的改动时加-dirty"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", ".."], cwd=HERE,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def format_result(r):
+    latency = r["latency_ms"]
+    latency_text = f"p50 {latency['p50']:.0f} p95 {latency['p95']:.0f} p99 {latency['p99']:.0f}ms" if latency else "-"
+    memory = f"{r['browser_peak_mb']:.0f}MB" if r["browser_peak_mb"] is not None else "-"
+    failed = "-" if r["failed"] is None else r["failed"]
+    speed = f"{r['records_per_min']:.1f}条/分" if r["records_per_min"] is not None else "未跑完"
+    return (f"{r['helper']}/{r['mode']}: {speed} 用时{r['wall_s']:.1f}s "
+            f"单条{latency_text} 浏览器{memory} 失败{failed} 退出码{r['exit_code']}")
+
+
+def print_comparison(report, old):
+    """和旧报告逐项对比每分钟条数"""
+    before = {(r["helper"], r["mode"]): r for r in old["results"]}
+    print(f"对比 {old['commit']} ({old['time']}):")
+    for r in report["results"]:
+        prev = before.get((r["helper"], r["mode"]))
+        if prev and prev["records_per_min"] and r["records_per_min"]:
+            change = r["records_per_min"] / prev["records_per_min"] - 1
+            print(f"  {r['helper']}/{r['mode']}: {prev['records_per_min']:.1f} -> {r['records_per_min']:.1f}条/分 ({change:+.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="两个助手在模拟门户上的端到端吞吐基准")
+    parser.add_argument("--records", type=int, default=50, help="每种执行方式处理的记录数(默认50)")
+    parser.add_argument("--workers", type=int, default=3, help="多页方式的并发页数(默认3)")
+    parser.add_argument("--latency", type=int, default=200, help="模拟门户接口延迟(毫秒，默认200)")
+    parser.add_argument("--jitter", type=int, default=100, help="接口随机附加延迟上限(毫秒，默认100)")
+    parser.add_argument("--page-latency", type=int, default=0, help="页面加载延迟(毫秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="接口返回500的概率")
+    parser.add_argument("--timeout", type=int, default=60, help="助手每个页面操作的最长等待秒数")
+    parser.add_argument("--browser", help="浏览器路径")
+    parser.add_argument("--only", help="只跑名称含该文字的方式，如 锁班 或 接口")
+    parser.add_argument("--output", help="报告路径(默认bench_reports/e2e_<提交号>.json)")
+    parser.add_argument("--compare", help="和这份旧报告对比")
+    args = parser.parse_args()
+
+    server, url = start_server(0, latency=args.latency, jitter=args.jitter, page_latency=args.page_latency,
+                               error_rate=args.error_rate, login_delay=0)
+    print(f"模拟门户: {url}")
+    if not HAS_PSUTIL:
+        print("未安装psutil，不统计浏览器内存(pip install psutil)")
+
+    scenarios = [s for s in SCENARIOS if not args.only or args.only in f"{s[0]}/{s[1]}"]
+    if not HAS_OPENPYXL:
+        print("未安装openpyxl，模拟门户无法解析导入文件，跳过整批导入")
+        scenarios = [s for s in scenarios if s[1] != "整批导入"]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n, scenario in enumerate(scenarios):
+            print(f"运行 {scenario[0]}/{scenario[1]} ({args.records}条)...")
+            result = run_scenario(url, os.path.join(tmpdir, str(n)), scenario, args)
+            print("  " + format_result(result))
+            if "log_tail" in result:
+                print(result["log_tail"])
+            results.append(result)
+    server.shutdown()
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "config": {"records": args.records, "workers": args.workers, "latency": args.latency,
+                   "jitter": args.jitter, "page_latency": args.page_latency, "error_rate": args.error_rate},
+        "results": results,
+    }
+    output = args.output or os.path.join(REPORT_DIR, f"e2e_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"报告已保存: {output}")
+    if commit.endswith("-dirty") or any("log_tail" in r for r in results):
+        print("有方式没跑完或代码有未提交的改动，这份报告不能作为基线")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(report, json.load(f))
+    sys.exit(0 if all("log_tail" not in r for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,746 @@
+# ieb门户离线模拟：复现飞行经历查询助手和通用锁班助手用到的页面、选择器和接口，
+# 用于在不连真实门户的情况下做性能测试和回归测试
+#
+# 用法: python mock_portal.py [--port 8800] [--latency 200] [--jitter 100] [--error-rate 0.05]
+# 助手连接模拟门户: 设置环境变量 IEB_PORTAL_URL=http://127.0.0.1:8800 后照常运行
+
+import argparse
+import hashlib
+import io
+import json
+import random
+import secrets
+import threading
+import time
+from datetime import date, datetime
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+try:
+    from openpyxl import load_workbook
+    HAS_OPENPYXL = True
+except ImportError:
+    HAS_OPENPYXL = False
+
+
+# 运行参数，由命令行设置
+CONFIG = {
+    "latency": 0,              # 接口固定延迟(毫秒)
+    "jitter": 0,               # 接口随机附加延迟上限(毫秒)
+    "page_latency": 0,         # 页面加载延迟(毫秒)
+    "error_rate": 0.0,         # 接口返回500的概率
+    "login_delay": 1000,       # 点击扫码登录后多久自动登录成功(毫秒)
+    "date_picker_only": False,  # 日期输入框只接受日期控件点选，用于测试点选路径
+    "verbose": False,
+}
+
+SESSION_COOKIE = "IEBSESSION"
+
+# 服务端状态：已登录的会话、已录入的锁班、请求计数
+STATE = {
+    "sessions": set(),
+    "locks": {},  # 员工号 -> [(开始, 结束, 类型)]
+    "stats": {"pages": 0, "api": 0, "errors": 0, "queries": 0, "submits": 0, "imports": 0},
+    "rng": random.Random(0),
+    "lock": threading.Lock(),
+}
+
+# 门户锁班类型下拉框的选项
+LEAVE_TYPES = [
+    "ALV-年假（公休假）", "ALV_FD-飞行员公休（订座）", "RECU_LVE-健康疗养", "RECU_LVE_R-康复疗养",
+    "MAT_FA_LVE-陪产假", "MAT_MO_LVE-产假", "PREGNANT-孕假", "PARENT_LVE-探亲假-探父母",
+    "SPOUSE_LVE-探亲假-探配偶", "MARR_LVE-婚假", "COMP_LVE-丧假", "CHILD_LVE-育儿假",
+    "INJURY_LVE-工伤假", "LWOP_LVE-其他（事假）", "UNPAID_LVE-无薪", "HOUSE_LVE-搬家",
+    "BREED_LVE-哺乳假", "PATERNITY-独生子女护理假", "BIRC_LVE-计划生育假", "REWARD_LVE-奖励",
+    "PENALTY-停飞", "PRD_LVE-经期假", "GRD-地面班", "GDO-地面休息", "TRNG1-训练",
+    "BS_STUDY-业务学习", "BUSINESS-公务", "GRD_ONDUTY-地面值班", "LG_STUDY-语言学习/考试",
+    "MEDL_CHK-体检_临床", "MEDL_PHLE-体检_抽血", "MEDL_EET-体检_平板", "MEDL_PSYC-体检_心理测试",
+    "MTG-会议", "MTG_SF-安全讲评会", "DGET-危险品培训", "EP-飞行人员应急复训", "CRM-CRM培训",
+    "T_SIM_INS-模拟机检查", "T_SIM_REC-模拟机复训", "T_SIM_INT-模拟机初始", "T_SIM_UPG-模拟机升级",
+    "T_SIM_CON-模拟机_转机型", "MAKEUP-补考", "BS_CONCL-飞行后讲评", "BS_CHK-业务检查",
+    "ADMN-管理任务", "SOCIAL-社会活动", "HANDBOOK-手册", "POL_STUDY-政治学习", "T/A-部门活动",
+]
+LEAVE_CODES = {t.split('-', 1)[0]: t for t in LEAVE_TYPES}
+
+# 飞行经历表格列(与页面表头顺序一致)和接口返回的JSON字段
+FLIGHT_COLUMNS = [
+    ("员工号", "empId"), ("姓名", "empName"), ("注册基地", "regBase"), ("运行基地", "runBase"),
+    ("技术信息", "techInfo"), ("开始日期", "beginDate"), ("结束日期", "endDate"),
+    ("飞行时间", "flyTime"), ("飞行经历", "flyExperience"), ("航段数", "legCount"),
+    ("夜航经历", "nightExperience"), ("左座经历", "leftSeat"), ("右座经历", "rightSeat"),
+    ("模拟机", "simulator"), ("本场时间", "localTime"), ("起落总数", "landingCount"),
+    ("航线起落", "routeLandings"), ("本场起落", "localLandings"), ("人工飞行时间", "manualTime"),
+]
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何林罗高"
+GIVEN_NAMES = ["伟", "芳", "娜", "敏", "静", "磊", "洋", "勇", "艳", "杰", "涛", "明", "超", "霞", "平", "刚"]
+BASES = ["广州", "北京", "深圳", "沈阳", "乌鲁木齐", "大连", "武汉"]
+TECH = ["A320 机长", "A320 副驾驶", "B737 机长", "B787 第一副驾驶", "A330 机长", "A350 副驾驶"]
+
+
+# ---------- 模拟数据 ----------
+
+def _seed(*parts):
+    """由输入算出稳定的随机种子，同样的查询每次返回同样的数据"""
+    return int(hashlib.md5("|".join(parts).encode("utf-8")).hexdigest()[:12], 16)
+
+
+def employee_name(emp_id):
+    """员工号对应的姓名，9开头的员工号视为不存在"""
+    if len(emp_id) != 6 or not emp_id.isdigit() or emp_id.startswith("9"):
+        return ""
+    rnd = random.Random(_seed(emp_id))
+    return rnd.choice(SURNAMES) + "".join(rnd.choice(GIVEN_NAMES) for _ in range(rnd.randint(1, 2)))
+
+
+def parse_date(text):
+    """接受YYYY-MM-DD、YYYY/MM/DD、YYYYMMDD，无法识别时返回None"""
+    text = (text or "").strip()
+    for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%Y%m%d"):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            pass
+    return None
+
+
+def _hours(minutes):
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+
+def flight_rows(emp_id, begin, end):
+    """飞行经历查询结果，员工不存在或日期无效时为空"""
+    name = employee_name(emp_id)
+    start, stop = parse_date(begin), parse_date(end)
+    if not name or not start or not stop or start > stop:
+        return []
+    rnd = random.Random(_seed(emp_id, begin, end))
+    days = (stop - start).days + 1
+    fly = rnd.randint(40, 85) * days
+    legs = max(1, fly // rnd.randint(90, 150))
+    # 备降、返航时航线起落比航段数少，两列的值不总相同
+    route_landings = legs - rnd.randint(0, 1) if legs > 1 else legs
+    local_landings = rnd.randint(0, 3)
+    values = {
+        "empId": emp_id, "empName": name, "regBase": rnd.choice(BASES), "runBase": rnd.choice(BASES),
+        "techInfo": rnd.choice(TECH), "beginDate": start.isoformat(), "endDate": stop.isoformat(),
+        "flyTime": _hours(fly), "flyExperience": _hours(fly + rnd.randint(30, 600)),
+        "legCount": legs, "nightExperience": _hours(fly // rnd.randint(3, 6)),
+        "leftSeat": _hours(fly // 2), "rightSeat": _hours(fly - fly // 2 + 1),
+        "simulator": _hours(rnd.randint(0, 8) * 60), "localTime": _hours(rnd.randint(0, 90)),
+        "landingCount": route_landings + local_landings, "routeLandings": route_landings,
+        "localLandings": local_landings, "manualTime": _hours(rnd.randint(10, 300)),
+    }
+    return [values]
+
+
+def lock_row(emp_id, code, start, end):
+    return [emp_id, employee_name(emp_id), LEAVE_CODES.get(code, code), start.isoformat(), end.isoformat()]
+
+
+def submit_lock(emp_id, code, begin, end):
+    """录入一条锁班，返回(结果行, 冲突行)；员工不存在或参数无效时结果为空"""
+    start, stop = parse_date(begin), parse_date(end)
+    if not employee_name(emp_id) or code not in LEAVE_CODES or not start or not stop or start > stop:
+        return [], []
+    with STATE["lock"]:
+        existing = STATE["locks"].setdefault(emp_id, [])
+        conflicts = [lock_row(emp_id, c, s, e) + ["时间冲突"] for s, e, c in existing if s <= stop and start <= e]
+        if not conflicts:
+            existing.append((start, stop, code))
+    return [lock_row(emp_id, code, start, stop)], conflicts
+
+
+def import_locks(data):
+    """解析通用批量锁班模板并逐行录入"""
+    if not HAS_OPENPYXL:
+        raise RuntimeError("模拟门户未安装openpyxl，无法解析导入文件")
+    wb = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    rows, conflicts = [], []
+    try:
+        for row in wb.active.iter_rows(min_row=2, values_only=True):
+            if not row or not row[0]:
+                continue
+            emp_id = str(row[0]).strip()
+            code = str(row[2] or "").split('-', 1)[0]
+            begin = row[3].strftime("%Y-%m-%d") if isinstance(row[3], (date, datetime)) else str(row[3] or "")
+            end = row[4].strftime("%Y-%m-%d") if isinstance(row[4], (date, datetime)) else str(row[4] or "")
+            result, conflict = submit_lock(emp_id, code, begin, end or begin)
+            if conflict:
+                conflicts.extend(conflict)
+            else:
+                rows.extend(result)
+    finally:
+        wb.close()
+    return rows, conflicts
+
+
+# ---------- 页面 ----------
+
+STYLE = """<style>
+body { font-family: sans-serif; font-size: 14px; margin: 0; }
+.top { background: #1d4e89; color: #fff; padding: 8px 16px; }
+.top span { margin-right: 24px; }
+.menu { float: left; width: 180px; margin: 0; padding: 8px 16px; }
+.menu ul { padding-left: 16px; }
+.main { margin-left: 220px; padding: 16px; }
+table { border-collapse: collapse; margin-top: 12px; }
+th, td { border: 1px solid #ccc; padding: 2px 6px; }
+input, select, button { margin: 4px; }
+</style>"""
+
+LOGIN_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>飞行门户 - 登录</title>__STYLE__</head>
+<body>
+<div class="top">飞行门户(模拟)</div>
+<div class="main">
+  <div id="scanLogin" style="cursor:pointer;border:1px solid #1d4e89;padding:8px;width:120px">扫码登录</div>
+  <div id="qrcode" hidden>请用手机扫码(模拟门户会自动登录)</div>
+</div>
+<script>
+document.getElementById('scanLogin').addEventListener('click', () => {
+    document.getElementById('qrcode').hidden = false;
+    setTimeout(() => { location.href = '/mock/scan'; }, __LOGIN_DELAY__);
+});
+</script>
+</body></html>"""
+
+INDEX_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>飞行门户</title>__STYLE__</head>
+<body>
+<div class="top"><span>统计应用</span><span>运行管理</span></div>
+<ul class="menu">
+  <li><span onclick="toggle('stat')">统计应用</span>
+    <ul id="stat" hidden>
+      <li><a href="#" onclick="toggle('report'); return false">综合报表</a>
+        <ul id="report" hidden><li><a href="/report/flyTimeExperience">飞行经历</a></li></ul>
+      </li>
+    </ul>
+  </li>
+  <li><span onclick="toggle('run')">运行管理</span>
+    <ul id="run" hidden>
+      <li><a href="#" onclick="toggle('task'); return false">非生产任务</a>
+        <ul id="task" hidden><li><a href="/nonproduction/import">非生产任务录入</a></li></ul>
+      </li>
+    </ul>
+  </li>
+</ul>
+<div class="main">欢迎使用飞行门户</div>
+<script>
+function toggle(id) {
+    const el = document.getElementById(id);
+    el.hidden = !el.hidden;
+}
+</script>
+</body></html>"""
+
+# 日期控件：和门户的控件一样放在页面第3个iframe里，月份输入框在前、年份输入框在后
+CALENDAR_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><style>
+body { font-family: sans-serif; font-size: 12px; margin: 4px; }
+input { width: 60px; }
+td { border: 1px solid #ddd; padding: 2px 4px; cursor: pointer; text-align: center; }
+</style></head>
+<body>
+<input id="month" readonly><input id="year" readonly>
+<table id="years" hidden><tbody></tbody></table>
+<table id="months" hidden><tbody></tbody></table>
+<table id="days"><tbody></tbody></table>
+<script>
+const MONTHS = ['一月', '二月', '三月', '四月', '五月', '六月', '七月', '八月', '九月', '十月', '十一', '十二'];
+const state = { year: 0, month: 0 };
+const $ = id => document.getElementById(id);
+
+function grid(table, items, perRow, onPick) {
+    const tbody = table.querySelector('tbody');
+    tbody.innerHTML = '';
+    let tr = null;
+    items.forEach((item, i) => {
+        if (i % perRow === 0) tr = tbody.insertRow();
+        const td = tr.insertCell();
+        td.textContent = item.text;
+        td.addEventListener('click', () => onPick(item.value));
+    });
+}
+
+function render() {
+    $('year').value = state.year;
+    $('month').value = MONTHS[state.month - 1];
+    const count = new Date(state.year, state.month, 0).getDate();
+    const days = Array.from({ length: count }, (_, i) => ({ text: String(i + 1), value: i + 1 }));
+    grid($('days'), days, 7, day => {
+        const pad = n => String(n).padStart(2, '0');
+        parent.mockPick(`${state.year}-${pad(state.month)}-${pad(day)}`);
+    });
+}
+
+$('year').addEventListener('click', () => {
+    const years = Array.from({ length: 20 }, (_, i) => ({ text: String(2016 + i), value: 2016 + i }));
+    grid($('years'), years, 5, year => { state.year = year; $('years').hidden = true; render(); });
+    $('years').hidden = false;
+});
+
+$('month').addEventListener('click', () => {
+    grid($('months'), MONTHS.map((m, i) => ({ text: m, value: i + 1 })), 4,
+         month => { state.month = month; $('months').hidden = true; render(); });
+    $('months').hidden = false;
+});
+
+window.mockReset = value => {
+    const m = /^(\\d{4})[-\\/](\\d{1,2})/.exec(value || '');
+    const today = new Date();
+    state.year = m ? Number(m[1]) : today.getFullYear();
+    state.month = m ? Number(m[2]) : today.getMonth() + 1;
+    $('years').hidden = true;
+    $('months').hidden = true;
+    render();
+};
+window.mockReset('');
+</script>
+</body></html>"""
+
+FLIGHT_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>飞行经历</title>__STYLE__</head>
+<body>
+<div class="top"><span>统计应用</span><span>综合报表</span><span>飞行经历</span></div>
+<div class="main">
+  <label><input type="radio" name="queryBy" value="base" checked>按基地查询</label>
+  <label><input type="radio" name="queryBy" value="fleet">按机队查询</label>
+  <label><input type="radio" name="queryBy" value="emp">按员工号查询</label>
+  <br>
+  <input id="empInput" placeholder="员工号或姓名">
+  <input id="flyTimeExperience_beginDate" class="Wdate" placeholder="开始日期">
+  <input id="flyTimeExperience_endDate" class="Wdate" placeholder="结束日期">
+  <button id="queryBtn">查询</button>
+  <div id="message"></div>
+  <iframe src="/blank" hidden></iframe>
+  <iframe src="/blank" hidden></iframe>
+  <iframe id="picker" src="/mock/calendar"
+          style="display:none;position:absolute;width:260px;height:240px;background:#fff;border:1px solid #999"></iframe>
+  <table>
+    <thead><tr>__HEADERS__</tr></thead>
+    <tbody class="list"></tbody>
+  </table>
+</div>
+<script>
+const FIELDS = __FIELDS__;
+const PICKER_ONLY = __PICKER_ONLY__;
+const picker = document.getElementById('picker');
+const tbody = document.querySelector('tbody.list');
+const dateInputs = ['flyTimeExperience_beginDate', 'flyTimeExperience_endDate'].map(id => document.getElementById(id));
+let activeInput = null;
+let seq = 0;
+
+dateInputs.forEach(input => {
+    input.addEventListener('click', () => {
+        activeInput = input;
+        const rect = input.getBoundingClientRect();
+        picker.style.left = rect.left + 'px';
+        picker.style.top = rect.bottom + 'px';
+        picker.style.display = 'block';
+        if (picker.contentWindow.mockReset) picker.contentWindow.mockReset(input.value);
+    });
+    if (PICKER_ONLY) {
+        // 只认日期控件选出的值，脚本直接写入的值会被改回
+        for (const type of ['input', 'change', 'blur']) {
+            input.addEventListener(type, () => {
+                if (input.value !== (input.dataset.picked || '')) input.value = input.dataset.picked || '';
+            });
+        }
+    }
+});
+
+window.mockPick = value => {
+    activeInput.dataset.picked = value;
+    activeInput.value = value;
+    activeInput.dispatchEvent(new Event('change', { bubbles: true }));
+    picker.style.display = 'none';
+};
+
+document.getElementById('queryBtn').addEventListener('click', async () => {
+    const body = new URLSearchParams({
+        empId: document.getElementById('empInput').value.trim(),
+        beginDate: dateInputs[0].value,
+        endDate: dateInputs[1].value,
+    });
+    const message = document.getElementById('message');
+    message.textContent = '';
+    let rows = [];
+    try {
+        const res = await fetch('/api/flyTimeExperience/query', { method: 'POST', body });
+        const data = await res.json();
+        if (!res.ok) throw new Error(data.msg || res.status);
+        rows = data.data.rows;
+    } catch (e) {
+        message.textContent = '查询失败: ' + e.message;
+    }
+    seq += 1;
+    tbody.innerHTML = '';
+    rows.forEach(row => {
+        const tr = tbody.insertRow();
+        tr.dataset.seq = seq;
+        FIELDS.forEach(key => { tr.insertCell().textContent = row[key]; });
+    });
+});
+</script>
+</body></html>"""
+
+LOCK_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>非生产任务录入</title>__STYLE__</head>
+<body>
+<div class="top"><span>运行管理</span><span>非生产任务</span><span>非生产任务录入</span></div>
+<div class="main" id="mainContent">
+  <div id="formView">
+    <input id="showIdshowNonproductionTaskImportPage" placeholder="员工号"> <span id="empName"></span><br>
+    <select id="lockType"><option value="">请选择</option>__OPTIONS__</select><br>
+    <input id="lockStartTime" placeholder="开始时间">
+    <input id="lockEndTime" placeholder="结束时间"><br>
+    <button id="nextBtn">下一步</button>
+    <input type="file" id="importFile" accept=".xlsx"> <button id="importBtn">导入</button>
+    <div id="message"></div>
+  </div>
+  <div id="resultView" hidden>
+    <div id="showNonproductionTaskImportResultPage1">
+      <h4>查询结果</h4>
+      <table><thead><tr><th>员工号</th><th>姓名</th><th>任务类型</th><th>开始时间</th><th>结束时间</th></tr></thead>
+      <tbody class="list"></tbody></table>
+    </div>
+    <div id="showNonproductionTaskImportResultPage2">
+      <h4>冲突列表</h4>
+      <table><thead><tr><th>员工号</th><th>姓名</th><th>已有任务</th><th>开始时间</th><th>结束时间</th><th>说明</th></tr></thead>
+      <tbody class="list"></tbody></table>
+    </div>
+    <button id="continueBtn">继续录入</button>
+  </div>
+</div>
+<script>
+const $ = id => document.getElementById(id);
+const empInput = $('showIdshowNonproductionTaskImportPage');
+
+empInput.addEventListener('change', async () => {
+    const id = empInput.value.trim();
+    $('empName').textContent = '';
+    if (!/^\\d{6}$/.test(id)) return;
+    try {
+        const res = await fetch('/api/employee?id=' + id);
+        const data = await res.json();
+        if (empInput.value.trim() === id) $('empName').textContent = data.name || '查无此人';
+    } catch (e) {
+        $('empName').textContent = '查询失败';
+    }
+});
+
+function fillTable(selector, rows, emptyText) {
+    const tbody = document.querySelector(selector + ' tbody.list');
+    tbody.innerHTML = '';
+    if (!rows.length && emptyText) {
+        const td = tbody.insertRow().insertCell();
+        td.colSpan = 6;
+        td.textContent = emptyText;
+    }
+    rows.forEach(cells => {
+        const tr = tbody.insertRow();
+        cells.forEach(text => { tr.insertCell().textContent = text; });
+    });
+}
+
+async function showResult(request) {
+    let rows = [], conflicts = [];
+    try {
+        const res = await request;
+        const data = await res.json();
+        if (!res.ok) throw new Error(data.msg || res.status);
+        rows = data.rows;
+        conflicts = data.conflicts;
+    } catch (e) {
+        $('message').textContent = '提交失败: ' + e.message;
+    }
+    fillTable('#showNonproductionTaskImportResultPage1', rows, '');
+    fillTable('#showNonproductionTaskImportResultPage2', conflicts, '没有相关信息');
+    $('formView').hidden = true;
+    $('resultView').hidden = false;
+}
+
+$('nextBtn').addEventListener('click', () => {
+    $('message').textContent = '';
+    showResult(fetch('/api/lock/submit', {
+        method: 'POST',
+        body: new URLSearchParams({
+            empId: empInput.value.trim(),
+            lockType: $('lockType').value,
+            startTime: $('lockStartTime').value,
+            endTime: $('lockEndTime').value,
+        }),
+    }));
+});
+
+$('importBtn').addEventListener('click', () => {
+    const file = $('importFile').files[0];
+    if (!file) {
+        $('message').textContent = '请选择导入文件';
+        return;
+    }
+    showResult(fetch('/api/lock/import', { method: 'POST', body: file }));
+});
+
+$('continueBtn').addEventListener('click', () => {
+    $('resultView').hidden = true;
+    $('formView').hidden = false;
+});
+</script>
+</body></html>"""
+
+
+def render_page(template, **values):
+    html = template.replace("__STYLE__", STYLE)
+    for key, value in values.items():
+        html = html.replace(f"__{key}__", value)
+    return html
+
+
+def flight_page():
+    headers = "".join(f"<th>{title}</th>" for title, _ in FLIGHT_COLUMNS)
+    return render_page(FLIGHT_HTML, HEADERS=headers,
+                       FIELDS=json.dumps([key for _, key in FLIGHT_COLUMNS]),
+                       PICKER_ONLY="true" if CONFIG["date_picker_only"] else "false")
+
+
+def lock_page():
+    options = "".join(f'<option value="{t.split("-", 1)[0]}">{t}</option>' for t in LEAVE_TYPES)
+    return render_page(LOCK_HTML, OPTIONS=options)
+
+
+# ---------- 服务 ----------
+
+class PortalHandler(BaseHTTPRequestHandler):
+    server_version = "IEBMock/1.0"
+
+    def log_message(self, format, *args):
+        if CONFIG["verbose"]:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self.route("GET")
+
+    def do_POST(self):
+        self.route("POST")
+
+    def route(self, method):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        handler = ROUTES.get((method, url.path))
+        if handler is None:
+            self.send_text(404, "Not Found")
+            return
+        if url.path.startswith("/api/"):
+            if not self.logged_in():
+                self.send_json(401, {"code": 401, "msg": "未登录"})
+                return
+            if self.inject_latency_and_error():
+                return
+        handler(self, query, body)
+
+    # 会话
+
+    def logged_in(self):
+        cookie = SimpleCookie(self.headers.get("Cookie") or "")
+        token = cookie.get(SESSION_COOKIE)
+        return token is not None and token.value in STATE["sessions"]
+
+    def require_login(self):
+        """未登录时跳转登录页，返回是否已登录"""
+        if self.logged_in():
+            return True
+        self.send_response(302)
+        self.send_header("Location", "/login")
+        self.end_headers()
+        return False
+
+    # 延迟和错误注入
+
+    def inject_latency_and_error(self):
+        """接口请求按配置延迟，并按概率返回500；返回是否已注入错误"""
+        with STATE["lock"]:
+            delay = CONFIG["latency"] + STATE["rng"].uniform(0, CONFIG["jitter"])
+            failed = STATE["rng"].random() < CONFIG["error_rate"]
+            STATE["stats"]["api"] += 1
+            if failed:
+                STATE["stats"]["errors"] += 1
+        if delay:
+            time.sleep(delay / 1000)
+        if failed:
+            self.send_json(500, {"code": 500, "msg": "模拟门户注入的错误"})
+        return failed
+
+    # 响应
+
+    def send_body(self, status, content_type, data, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_text(self, status, text):
+        self.send_body(status, "text/plain; charset=utf-8", text.encode("utf-8"))
+
+    def send_json(self, status, data):
+        self.send_body(status, "application/json; charset=utf-8", json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    def send_page(self, html):
+        with STATE["lock"]:
+            STATE["stats"]["pages"] += 1
+        if CONFIG["page_latency"]:
+            time.sleep(CONFIG["page_latency"] / 1000)
+        self.send_body(200, "text/html; charset=utf-8", html.encode("utf-8"))
+
+
+def _form(body):
+    return {k: v[0] for k, v in parse_qs(body.decode("utf-8")).items()}
+
+
+def login_page(h, query, body):
+    h.send_page(render_page(LOGIN_HTML, LOGIN_DELAY=str(CONFIG["login_delay"])))
+
+
+def scan(h, query, body):
+    token = secrets.token_hex(16)
+    with STATE["lock"]:
+        STATE["sessions"].add(token)
+    h.send_response(302)
+    h.send_header("Set-Cookie", f"{SESSION_COOKIE}={token}; Path=/; HttpOnly")
+    h.send_header("Location", "/index/index")
+    h.end_headers()
+
+
+def index_page(h, query, body):
+    if h.require_login():
+        h.send_page(render_page(INDEX_HTML))
+
+
+def flight_report_page(h, query, body):
+    if h.require_login():
+        h.send_page(flight_page())
+
+
+def lock_entry_page(h, query, body):
+    if h.require_login():
+        h.send_page(lock_page())
+
+
+def calendar_page(h, query, body):
+    h.send_page(CALENDAR_HTML)
+
+
+def blank_page(h, query, body):
+    h.send_page("<!DOCTYPE html><html><body></body></html>")
+
+
+def query_api(h, query, body):
+    form = _form(body)
+    with STATE["lock"]:
+        STATE["stats"]["queries"] += 1
+    rows = flight_rows(form.get("empId", ""), form.get("beginDate", ""), form.get("endDate", ""))
+    h.send_json(200, {"code": 0, "data": {"total": len(rows), "rows": rows}})
+
+
+def employee_api(h, query, body):
+    emp_id = query.get("id", "")
+    h.send_json(200, {"code": 0, "id": emp_id, "name": employee_name(emp_id)})
+
+
+def submit_api(h, query, body):
+    form = _form(body)
+    with STATE["lock"]:
+        STATE["stats"]["submits"] += 1
+    rows, conflicts = submit_lock(form.get("empId", ""), form.get("lockType", ""),
+                                  form.get("startTime", ""), form.get("endTime", ""))
+    h.send_json(200, {"code": 0, "rows": rows, "conflicts": conflicts})
+
+
+def import_api(h, query, body):
+    with STATE["lock"]:
+        STATE["stats"]["imports"] += 1
+    try:
+        rows, conflicts = import_locks(body)
+    except Exception as e:
+        h.send_json(400, {"code": 400, "msg": f"导入文件无法解析: {e}"})
+        return
+    h.send_json(200, {"code": 0, "rows": rows, "conflicts": conflicts})
+
+
+def reset_api(h, query, body):
+    """清空已录入的锁班和计数，登录状态保留"""
+    with STATE["lock"]:
+        STATE["locks"].clear()
+        for key in STATE["stats"]:
+            STATE["stats"][key] = 0
+    h.send_json(200, {"code": 0})
+
+
+def stats_api(h, query, body):
+    with STATE["lock"]:
+        data = dict(STATE["stats"], sessions=len(STATE["sessions"]),
+                    locks=sum(len(v) for v in STATE["locks"].values()))
+    h.send_json(200, data)
+
+
+ROUTES = {
+    ("GET", "/login"): login_page,
+    ("GET", "/mock/scan"): scan,
+    ("GET", "/index/index"): index_page,
+    ("GET", "/report/flyTimeExperience"): flight_report_page,
+    ("GET", "/nonproduction/import"): lock_entry_page,
+    ("GET", "/mock/calendar"): calendar_page,
+    ("GET", "/blank"): blank_page,
+    ("POST", "/api/flyTimeExperience/query"): query_api,
+    ("GET", "/api/employee"): employee_api,
+    ("POST", "/api/lock/submit"): submit_api,
+    ("POST", "/api/lock/import"): import_api,
+    ("POST", "/mock/reset"): reset_api,
+    ("GET", "/mock/stats"): stats_api,
+}
+
+
+def start_server(port=0, **options):
+    """在后台线程启动模拟门户，返回(server, 门户地址)；port为0时随机选空闲端口"""
+    CONFIG.update(options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), PortalHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ieb门户离线模拟")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", type=int, default=0, help="接口固定延迟(毫秒)")
+    parser.add_argument("--jitter", type=int, default=0, help="接口随机附加延迟上限(毫秒)")
+    parser.add_argument("--page-latency", type=int, default=0, help="页面加载延迟(毫秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="接口返回500的概率(0~1)")
+    parser.add_argument("--login-delay", type=int, default=1000, help="点击扫码登录后自动登录的延迟(毫秒)")
+    parser.add_argument("--date-picker-only", action="store_true", help="日期框只接受日期控件点选")
+    parser.add_argument("--seed", type=int, default=0, help="延迟和错误注入的随机种子")
+    parser.add_argument("--verbose", action="store_true", help="打印每个请求")
+    args = parser.parse_args()
+    STATE["rng"].seed(args.seed)
+    server, url = start_server(
+        args.port, latency=args.latency, jitter=args.jitter, page_latency=args.page_latency,
+        error_rate=args.error_rate, login_delay=args.login_delay,
+        date_picker_only=args.date_picker_only, verbose=args.verbose)
+    print(f"模拟门户已启动: {url}")
+    print(f"助手使用前设置环境变量 IEB_PORTAL_URL={url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,16 @@
 # 通用锁班助手
 
 import re
+import json
+import math
+import io
 import platform
 import os
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta
 from colorama import init, Fore, Style
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
 
 try:
     from openpyxl import Workbook, load_workbook
@@ -87,6 +92,73 @@ LEAVE_TYPE_MAP = {
 # 代码到中文名的反向映射
 LEAVE_CODE_TO_NAME = {v: k for k, v in LEAVE_TYPE_MAP.items()}
 
+# 中文名到代码，如 "年假（公休假）" -> "ALV"
+LEAVE_NAME_TO_CODE = {k.split('-', 1)[1]: v for k, v in LEAVE_TYPE_MAP.items()}
+
+# 全称和代码 -> 代码
+LEAVE_TOKEN_TO_CODE = {**LEAVE_TYPE_MAP, **{v: v for v in LEAVE_TYPE_MAP.values()}}
+
+
+def _name_part_index(names):
+    """中文名的每个片段 -> 含这个片段的所有代码，如 "体检" -> ("MEDL_CHK", "MEDL_PHLE", ...)"""
+    index = {}
+    for name, code in names.items():
+        for i in range(len(name)):
+            for j in range(i + 1, len(name) + 1):
+                codes = index.setdefault(name[i:j], [])
+                if code not in codes:
+                    codes.append(code)
+    return {part: tuple(codes) for part, codes in index.items()}
+
+
+# 只写了中文名的一部分时查这个索引，查找耗时和类型数量无关
+LEAVE_NAME_PARTS = _name_part_index(LEAVE_NAME_TO_CODE)
+
+
+def _longest_first_pattern(tokens, code_boundary=False):
+    """把所有候选词编译成一个正则，同一位置长的优先匹配
+    
+    code_boundary为True时代码两侧不能紧挨字母或下划线，避免ALV匹配到ALV_FD里面
+    开头先用候选词首字的字符集预判，不是首字的位置不用逐个尝试候选词
+    """
+    parts = []
+    for token in sorted(tokens, key=len, reverse=True):
+        part = re.escape(token)
+        if code_boundary and token in LEAVE_CODE_TO_NAME:
+            part = rf"(?<![A-Za-z_]){part}(?![A-Za-z_])"
+        parts.append(part)
+    first = "".join(sorted({re.escape(token[0]) for token in tokens}))
+    return re.compile(f"(?=[{first}])(?:{'|'.join(parts)})")
+
+
+# 启动时编译一次，每行只扫描一遍
+LEAVE_TOKEN_RE = _longest_first_pattern(LEAVE_TOKEN_TO_CODE, code_boundary=True)
+LEAVE_NAME_RE = _longest_first_pattern(LEAVE_NAME_TO_CODE)
+EMP_ID_RE = re.compile(r'\d{6}')
+# 员工号两侧不能紧挨数字或字母，可以直接跟汉字姓名(\b会把汉字当成单词字符)
+EMP_BOUNDED_RE = re.compile(r'(?<![\dA-Za-z_])\d{6}(?![\dA-Za-z_])')
+NON_DIGIT_RE = re.compile(r'\D')
+# 连写记录的起点：6位数字紧跟汉字，前面是文本开头、空白、标点或上一条的日期(分隔符后两位的日)
+# 前面紧挨数字或字母时是别的数字的一部分(1234567张三、A123456张三、2026010张三)，不在这里切
+RECORD_START_RE = re.compile(r'(?:(?<![\dA-Za-z_])|(?<=[-/]\d\d))(?=\d{6}[\u4e00-\u9fa5])')
+LINE_RE = re.compile(r'[^\n]+')
+
+# 单条记录的分词器，一次扫描取出所有字段：
+#   run   连续数字，结尾6位符合EMP_BOUNDED_RE时是员工号
+#         后面跟 -/月-/日 时是日期(年份取run最后4位)，跟2-4个汉字时是姓名
+#   leave 锁班类型全称或代码，和LEAVE_TOKEN_RE相同
+RECORD_TOKEN_RE = re.compile(
+    r'(?P<run>\d+)'
+    r'(?:[-/](?P<month>\d{1,2})[-/](?P<day>\d{1,2})|\s*(?P<name>[\u4e00-\u9fa5]{2,4}))?'
+    r'|(?P<leave>' + LEAVE_TOKEN_RE.pattern + r')'
+)
+
+
+def match_leave_type(text: str) -> str:
+    """在文本中找类型全称或代码，返回代码"""
+    m = LEAVE_TOKEN_RE.search(text)
+    return LEAVE_TOKEN_TO_CODE[m.group()] if m else None
+
 
 def parse_leave_type(text: str) -> str:
     """解析锁班类型，支持代码或中文名"""
@@ -99,25 +171,35 @@ def parse_leave_type(text: str) -> str:
     # 完整格式 "CODE-中文名"
     if text in LEAVE_TYPE_MAP:
         return LEAVE_TYPE_MAP[text]
-    # 只有中文名，模糊匹配
-    for key, code in LEAVE_TYPE_MAP.items():
-        name_part = key.split('-', 1)[1] if '-' in key else key
-        if name_part in text or text in name_part:
-            return code
-    return None
+    # 包含代码或完整格式
+    code = match_leave_type(text)
+    if code:
+        return code
+    # 包含中文名
+    m = LEAVE_NAME_RE.search(text)
+    if m:
+        return LEAVE_NAME_TO_CODE[m.group()]
+    # 只写了中文名的一部分，对得上多个类型时不猜
+    codes = LEAVE_NAME_PARTS.get(text, ())
+    return codes[0] if len(codes) == 1 else None
 
 
-def parse_excel_file(filepath: str, whitelist: set = None) -> tuple:
-    """解析Excel文件，返回(records, errors)"""
-    if not HAS_OPENPYXL:
-        return [], ["未安装openpyxl库，请运行: pip install openpyxl"]
-    
-    records = []
-    errors = []
-    
+def ambiguous_leave_types(text) -> tuple:
+    """text是多个类型中文名共有的片段时返回这些代码，否则返回空元组"""
+    codes = LEAVE_NAME_PARTS.get(str(text).strip(), ()) if text else ()
+    return codes if len(codes) > 1 else ()
+
+
+def iter_excel_records(filepath: str, whitelist: set = None, errors: list = None):
+    """逐行读取Excel文件，产出校验通过的记录，错误追加到errors"""
+    if errors is None:
+        errors = []
+    # 只读模式逐行读取，不载入单元格样式，读大文件时工作簿本身占的内存小得多
+    wb = load_workbook(filepath, read_only=True, data_only=True)
     try:
-        wb = load_workbook(filepath, data_only=True)
         ws = wb.active
+        # 有些软件导出的文件尺寸信息不准，按实际存在的行读取
+        ws.reset_dimensions()
         
         # 跳过表头，从第2行开始
         for row_num, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
@@ -132,7 +214,7 @@ def parse_excel_file(filepath: str, whitelist: set = None) -> tuple:
             end_date = row[4] if len(row) > 4 else None
             
             # 验证员工号
-            if not emp_id or not re.match(r'^\d{6}$', emp_id):
+            if not emp_id or not EMP_ID_RE.fullmatch(emp_id):
                 if emp_id and emp_id != 'None':
                     errors.append(f"第{row_num}行: 员工号格式错误 [{emp_id}]")
                 continue
@@ -144,7 +226,11 @@ def parse_excel_file(filepath: str, whitelist: set = None) -> tuple:
             # 解析锁班类型
             leave_type = parse_leave_type(leave_type_raw)
             if not leave_type:
-                errors.append(f"第{row_num}行: 未识别锁班类型 [{leave_type_raw}]")
+                candidates = ambiguous_leave_types(leave_type_raw)
+                if candidates:
+                    errors.append(f"第{row_num}行: 锁班类型不明确 [{leave_type_raw}]，可能是 {'/'.join(candidates)}")
+                else:
+                    errors.append(f"第{row_num}行: 未识别锁班类型 [{leave_type_raw}]")
                 continue
             
             # 解析日期
@@ -162,15 +248,31 @@ def parse_excel_file(filepath: str, whitelist: set = None) -> tuple:
                 errors.append(f"第{row_num}行: 日期格式错误")
                 continue
             
-            records.append({
+            yield {
                 "员工号": emp_id,
                 "姓名": name,
                 "请假类型": leave_type,
                 "开始日期": start,
                 "结束日期": end or start
-            })
-        
+            }
+    finally:
         wb.close()
+
+
+def parse_excel_file(filepath: str, whitelist: set = None) -> tuple:
+    """解析Excel文件，返回(records, errors)
+    
+    记录仍收集成列表：开始前要显示全部记录并确认，合并提交要用到全部记录
+    """
+    if not HAS_OPENPYXL:
+        return [], ["未安装openpyxl库，请运行: pip install openpyxl"]
+    
+    records = []
+    errors = []
+    
+    try:
+        for record in iter_excel_records(filepath, whitelist, errors):
+            records.append(record)
     except Exception as e:
         errors.append(f"读取Excel失败: {e}")
     
@@ -195,59 +297,98 @@ def c_hint(text):
 
 def parse_whitelist(text: str) -> set:
     """解析员工号白名单"""
-    all_nums = re.findall(r'\d{6}', re.sub(r'\D', ' ', text))
+    all_nums = EMP_ID_RE.findall(NON_DIGIT_RE.sub(' ', text))
     if all_nums:
         return set(all_nums)
-    text = re.sub(r'\D', '', text)
+    text = NON_DIGIT_RE.sub('', text)
     return set(text[i:i+6] for i in range(0, len(text), 6) if len(text[i:i+6]) == 6)
 
 
 def normalize_date(date_str: str) -> str:
-    """把各种日期格式统一转成YYYY-MM-DD"""
-    parts = re.split(r'[-/]', date_str)
-    if len(parts) == 3:
-        year, month, day = parts
-        return f"{year}-{month.zfill(2)}-{day.zfill(2)}"
+    """把各种日期格式统一转成YYYY-MM-DD，用RECORD_TOKEN_RE的日期规则，不是日期时原样返回"""
+    m = RECORD_TOKEN_RE.fullmatch(date_str)
+    if m and m.group("month"):
+        return f"{m.group('run')}-{m.group('month').zfill(2)}-{m.group('day').zfill(2)}"
     return date_str
 
 
 def parse_single_record(text: str) -> dict:
-    """解析单条记录"""
+    """解析单条记录，用RECORD_TOKEN_RE一次扫描
+    
+    各字段取第一次出现的值，结果和分别用正则查找员工号、姓名、类型、日期相同
+    """
     result = {"员工号": None, "姓名": None, "请假类型": None, "开始日期": None, "结束日期": None}
-    emp = re.search(r'\b(\d{6})\b', text)
-    if emp:
-        result["员工号"] = emp.group(1)
-    name = re.search(r'\d{6}\s*([\u4e00-\u9fa5]{2,4})', text)
-    if name:
-        result["姓名"] = name.group(1)
-    # 使用新的解析函数
-    for key, val in LEAVE_TYPE_MAP.items():
-        if key in text or val in text:
-            result["请假类型"] = val
-            break
-    dates = re.findall(r'\d{4}[-/]\d{1,2}[-/]\d{1,2}', text)
+    dates = []
+    date_end = 0  # 上一个日期的结束位置，日期之间不重叠
+    for m in RECORD_TOKEN_RE.finditer(text):
+        leave = m.group("leave")
+        if leave:
+            if not result["请假类型"]:
+                result["请假类型"] = LEAVE_TOKEN_TO_CODE[leave]
+            continue
+        end = m.end("run")
+        # 日期的日和后面的数字连着时run不是从数字开头切的，按原文判断员工号边界
+        if not result["员工号"] and end >= 6 and EMP_BOUNDED_RE.match(text, end - 6):
+            result["员工号"] = text[end-6:end]
+        month = m.group("month")
+        if month:
+            # 年份可能和前面的数字连在一起，只取紧挨分隔符的4位
+            year = text[end-4:end]
+            if end - 4 >= date_end and year.isdecimal() and len(dates) < 2:
+                dates.append(f"{year}-{month.zfill(2)}-{m.group('day').zfill(2)}")
+                date_end = m.end()
+        elif m.group("name") and not result["姓名"] and end >= 6 and text[end-6:end].isdecimal():
+            result["姓名"] = m.group("name")
     if dates:
-        result["开始日期"] = normalize_date(dates[0])
-        result["结束日期"] = normalize_date(dates[1]) if len(dates) > 1 else normalize_date(dates[0])
+        result["开始日期"] = dates[0]
+        result["结束日期"] = dates[-1]
     return result
 
 
+def iter_record_parts(text: str, pos: int = 0, endpos: int = None):
+    """在text[pos:endpos]里按记录起点逐条产出记录，不含员工号的片段丢掉
+    
+    只在相邻两个起点之间切片，不先把整段拆成列表
+    """
+    if endpos is None:
+        endpos = len(text)
+    for m in RECORD_START_RE.finditer(text, pos, endpos):
+        part = text[pos:m.start()].strip()
+        if part and EMP_ID_RE.search(part):
+            yield part
+        pos = m.start()
+    part = text[pos:endpos].strip()
+    if part and EMP_ID_RE.search(part):
+        yield part
+
+
 def split_continuous_text(text: str) -> list:
     """把连续粘贴的文本按员工号切分成多条记录"""
-    # 按6位员工号切分
-    parts = re.split(r'(?=\d{6}[\u4e00-\u9fa5])', text)
-    return [p.strip() for p in parts if p.strip() and re.search(r'\d{6}', p)]
+    return list(iter_record_parts(text))
+
+
+def iter_segments(text: str):
+    """把粘贴的文本逐条切成记录，换行分隔和员工号连写可以混在一起
+    
+    和原来一样一行是一条记录；一行里有两处以上记录起点(换行丢失)时才按员工号切开。
+    逐行边切边产出，不会把整段文本拆成列表，很长的一行也只在原文上切片
+    """
+    for m in LINE_RE.finditer(text):
+        start, end = m.span()
+        starts = RECORD_START_RE.finditer(text, start, end)
+        if next(starts, None) and next(starts, None):
+            yield from iter_record_parts(text, start, end)
+            continue
+        line = m.group().strip()
+        if line:
+            yield line
 
 
 def parse_batch_input(text: str, whitelist: set = None) -> tuple:
     """解析批量输入"""
     records = []
     errors = []
-    # 先按换行分，如果只有一行且很长，尝试按员工号切分
-    lines = [line.strip() for line in text.strip().split('\n') if line.strip()]
-    if len(lines) == 1 and len(lines[0]) > 100:
-        lines = split_continuous_text(lines[0])
-    for i, line in enumerate(lines, 1):
+    for i, line in enumerate(iter_segments(text), 1):
         record = parse_single_record(line)
         if whitelist and record["员工号"] and record["员工号"] not in whitelist:
             continue
@@ -271,21 +412,170 @@ def clear_form(page):
     page.locator("#lockEndTime").fill("")
 
 
+# 员工号输入后等待员工信息查询返回、表单渲染稳定，不再固定等待
+LOOKUP_TIMEOUT = 5000   # 等待员工信息查询请求返回的最长时间(毫秒)
+SETTLE_MS = 50          # 表单连续多久无变化算渲染完成(毫秒)
+SETTLE_TIMEOUT = 1000   # 等待渲染完成的最长时间(毫秒)
+LOOKUP_MISSES = 3       # 连续几条没等到查询请求后，本次运行只等待页面渲染
+
+# misses: 连续没等到员工信息查询请求的条数, off: 本次运行已不再等待查询请求
+LOOKUP = {"misses": 0, "off": False}
+LOOKUP_LOCK = threading.Lock()
+
+# 各步骤耗时(毫秒)，用于统计
+STEP_STATS = {}
+
+# 耗时追踪：每条记录的各步骤耗时追加写入TRACE_FILE(每行一个JSON)，空字符串表示不写
+TRACE_FILE = "lock_trace.jsonl"
+TRACE_LOCK = threading.Lock()
+RUN_STATS = {"run": datetime.now().strftime("%Y%m%d_%H%M%S"), "start": time.perf_counter(), "records": 0}
+
+EMP_CHANGED_JS = """
+    const input = document.querySelector('#showIdshowNonproductionTaskImportPage');
+    if (input) {
+        input.dispatchEvent(new Event('blur', { bubbles: true }));
+        input.dispatchEvent(new Event('change', { bubbles: true }));
+    }
+"""
+
+DOM_SETTLED_JS = """([quiet, limit]) => new Promise(resolve => {
+    let timer = setTimeout(done, quiet);
+    const deadline = setTimeout(done, limit);
+    const observer = new MutationObserver(() => {
+        clearTimeout(timer);
+        timer = setTimeout(done, quiet);
+    });
+    observer.observe(document.body, { childList: true, subtree: true, attributes: true, characterData: true });
+    function done() {
+        observer.disconnect();
+        clearTimeout(timer);
+        clearTimeout(deadline);
+        resolve(true);
+    }
+})"""
+
+
+def wait_settled(page):
+    """等待页面DOM连续SETTLE_MS毫秒无变化"""
+    page.evaluate(DOM_SETTLED_JS, [SETTLE_MS, SETTLE_TIMEOUT])
+
+
+def is_lookup_response(response, emp_id):
+    """员工信息查询请求：URL或请求体里带着这个员工号的xhr/fetch请求"""
+    request = response.request
+    if request.resource_type not in ("xhr", "fetch"):
+        return False
+    try:
+        body = request.post_data or ""
+    except (UnicodeDecodeError, ValueError):
+        body = ""
+    return str(emp_id) in request.url or str(emp_id) in body
+
+
+def wait_employee_lookup(page, emp_id):
+    """触发员工号blur/change，等待这个员工的信息查询返回并渲染完成
+    
+    某一条没等到查询请求时这一条退回只等待页面渲染；连续LOOKUP_MISSES条都没等到
+    (门户对员工号编码或改了参数名)时，本次运行不再等待查询请求，避免每条都等满LOOKUP_TIMEOUT
+    """
+    if LOOKUP["off"]:
+        page.evaluate(EMP_CHANGED_JS)
+        wait_settled(page)
+        return
+    try:
+        with page.expect_response(lambda r: is_lookup_response(r, emp_id),
+                                  timeout=LOOKUP_TIMEOUT) as response_info:
+            page.evaluate(EMP_CHANGED_JS)
+        response_info.value.finished()
+        with LOOKUP_LOCK:
+            LOOKUP["misses"] = 0
+    except PlaywrightTimeoutError:
+        print(c_warn(f"{emp_id}: 未检测到员工信息查询请求，只等待页面渲染"))
+        with LOOKUP_LOCK:
+            LOOKUP["misses"] += 1
+            switch_off = LOOKUP["misses"] >= LOOKUP_MISSES and not LOOKUP["off"]
+            if switch_off:
+                LOOKUP["off"] = True
+        if switch_off:
+            print(c_warn(f"连续{LOOKUP_MISSES}条未检测到员工信息查询请求，本次运行改为只等待页面渲染"))
+    wait_settled(page)
+
+
+def mark_step(timings, step, start):
+    """记录从start到现在的步骤耗时，返回当前时间"""
+    now = time.perf_counter()
+    ms = (now - start) * 1000
+    timings[step] = ms
+    STEP_STATS.setdefault(step, []).append(ms)
+    return now
+
+
+def format_timings(timings):
+    """格式化单条记录的步骤耗时"""
+    return " ".join(f"{step}{ms:.0f}ms" for step, ms in timings.items())
+
+
+def percentile(values, p):
+    """最近秩法求第p百分位数"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def start_run():
+    """开始一次批量提交，清空步骤统计"""
+    STEP_STATS.clear()
+    RUN_STATS.update(run=datetime.now().strftime("%Y%m%d_%H%M%S"), start=time.perf_counter(), records=0)
+
+
+def trace_record(record, timings, result):
+    """统计一条记录，并把各步骤耗时追加写入TRACE_FILE"""
+    with TRACE_LOCK:
+        RUN_STATS["records"] += 1
+        if not TRACE_FILE:
+            return
+        entry = {
+            "run": RUN_STATS["run"],
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "员工号": record["员工号"],
+            "请假类型": record["请假类型"],
+            "开始日期": record["开始日期"],
+            "结束日期": record["结束日期"],
+            "steps": {step: round(ms, 1) for step, ms in timings.items()},
+            "total_ms": round(sum(timings.values()), 1),
+            "result": result,
+        }
+        try:
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(c_warn(f"写入耗时追踪失败: {e}"))
+
+
+def step_report():
+    """返回本次运行各步骤耗时的p50/p95/p99和每分钟处理条数"""
+    lines = ["步骤耗时:"]
+    for step, values in STEP_STATS.items():
+        if values:
+            lines.append(f"  {step}: p50 {percentile(values, 50):.0f}ms | p95 {percentile(values, 95):.0f}ms | "
+                         f"p99 {percentile(values, 99):.0f}ms ({len(values)}次)")
+    elapsed = time.perf_counter() - RUN_STATS["start"]
+    if RUN_STATS["records"] and elapsed > 0:
+        lines.append(f"共{RUN_STATS['records']}条,用时{elapsed:.0f}s,每分钟{RUN_STATS['records'] / elapsed * 60:.1f}条")
+    return "\n".join(lines)
+
+
 def fill_form(page, emp_id, leave_type, start_date, end_date):
-    """填写表单"""
+    """填写表单，返回各步骤耗时(毫秒)"""
+    timings = {}
+    start = time.perf_counter()
     clear_form(page)
     emp_input = page.locator("#showIdshowNonproductionTaskImportPage")
     emp_input.click()
     emp_input.fill("")
     emp_input.type(str(emp_id), delay=10)
-    page.evaluate("""
-        const input = document.querySelector('#showIdshowNonproductionTaskImportPage');
-        if (input) {
-            input.dispatchEvent(new Event('blur', { bubbles: true }));
-            input.dispatchEvent(new Event('change', { bubbles: true }));
-        }
-    """)
-    page.wait_for_timeout(1000)
+    start = mark_step(timings, "员工号", start)
+    wait_employee_lookup(page, emp_id)
+    start = mark_step(timings, "员工查询", start)
     # 用JS直接设置下拉框值并触发事件
     page.evaluate("""(leaveType) => {
         const select = document.querySelector('#lockType');
@@ -299,9 +589,12 @@ def fill_form(page, emp_id, leave_type, start_date, end_date):
             select.dispatchEvent(new Event('blur', { bubbles: true }));
         }
     }""", leave_type)
-    page.wait_for_timeout(500)
+    wait_settled(page)
+    start = mark_step(timings, "锁班类型", start)
     page.locator("#lockStartTime").fill(start_date)
     page.locator("#lockEndTime").fill(end_date)
+    mark_step(timings, "日期", start)
+    return timings
 
 
 def submit_and_check(page):
@@ -335,6 +628,15 @@ def submit_and_check(page):
         return False, conflict_info
 
 
+def timed_submit(page, record, timings):
+    """提交并检查冲突，提交耗时记入timings，并写入耗时追踪"""
+    start = time.perf_counter()
+    success, conflict_info = submit_and_check(page)
+    mark_step(timings, "提交", start)
+    trace_record(record, timings, "成功" if success else (conflict_info or "有冲突"))
+    return success, conflict_info
+
+
 def whitelist_status(whitelist):
     """返回白名单状态文字"""
     if whitelist:
@@ -379,6 +681,87 @@ def format_record(r):
     return f"{r['员工号']} {name} {r['请假类型']} {r['开始日期']}~{r['结束日期']}"
 
 
+COALESCE_RANGES = True  # 同一员工同类型日期相连或重叠的记录合并成一次提交
+
+
+def next_day(date_str):
+    """YYYY-MM-DD的后一天，日期格式不对时原样返回(只按重叠合并)"""
+    try:
+        return (datetime.strptime(date_str, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+    except ValueError:
+        return date_str
+
+
+def coalesce_records(records):
+    """把同一员工、同一类型日期相连或重叠的记录合并成一条提交
+    
+    合并后的记录按组内最早一条的输入位置排序，"原始记录"里保留被合并的输入行，
+    失败时按原始行报告。没有被合并的记录原样返回。
+    """
+    groups = {}
+    for index, r in enumerate(records):
+        groups.setdefault((r["员工号"], r["请假类型"]), []).append(index)
+    planned = []  # [最早输入位置, 合并后的记录]
+    for indexes in groups.values():
+        indexes.sort(key=lambda i: (records[i]["开始日期"], records[i]["结束日期"]))
+        current = None
+        for i in indexes:
+            r = records[i]
+            if current is not None and r["开始日期"] <= next_day(current[1]["结束日期"]):
+                merged = current[1]
+                merged["原始记录"].append(r)
+                merged["结束日期"] = max(merged["结束日期"], r["结束日期"])
+                merged["姓名"] = merged["姓名"] or r["姓名"]
+                current[0] = min(current[0], i)
+                continue
+            current = [i, {**r, "原始记录": [r]}]
+            planned.append(current)
+    planned.sort(key=lambda item: item[0])
+    return [r if len(r["原始记录"]) > 1 else r["原始记录"][0] for _, r in planned]
+
+
+def plan_submissions(records):
+    """提交前合并连续日期，并显示合并前后的提交次数"""
+    if not COALESCE_RANGES:
+        return records
+    planned = coalesce_records(records)
+    if len(planned) < len(records):
+        print(c_info(f"同一员工同类型的连续日期已合并: {len(records)}条 -> {len(planned)}次提交"))
+    return planned
+
+
+def expand_failed(failed_records):
+    """合并提交的失败记录还原成操作员输入的原始行"""
+    return [(orig, reason) for r, reason in failed_records for orig in r.get("原始记录", [r])]
+
+
+def split_overlaps(records):
+    """找出同一员工日期重叠的记录，返回(可提交记录, 重叠记录[(record, 原因)])
+    
+    按员工分组后按开始日期排序扫描，与已保留记录重叠的后开始记录不提交。
+    日期已统一成YYYY-MM-DD，可直接按字符串比较。
+    """
+    groups = {}
+    for index, r in enumerate(records):
+        groups.setdefault(r["员工号"], []).append(index)
+    rejected = {}
+    for indexes in groups.values():
+        if len(indexes) < 2:
+            continue
+        indexes.sort(key=lambda i: (records[i]["开始日期"], records[i]["结束日期"]))
+        latest = None  # 已保留记录中结束日期最晚的一条
+        for i in indexes:
+            r = records[i]
+            if latest is not None and r["开始日期"] <= records[latest]["结束日期"]:
+                rejected[i] = f"与 {format_record(records[latest])} 日期重叠"
+                continue
+            if latest is None or r["结束日期"] > records[latest]["结束日期"]:
+                latest = i
+    kept = [r for i, r in enumerate(records) if i not in rejected]
+    overlaps = [(records[i], rejected[i]) for i in sorted(rejected)]
+    return kept, overlaps
+
+
 def go_back_to_form(page):
     """从结果页返回表单页"""
     try:
@@ -389,7 +772,8 @@ def go_back_to_form(page):
 
 
 def print_failed_records(failed_records):
-    """打印失败记录并写入日志文件"""
+    """打印失败记录并写入日志文件，合并提交的记录按原始行列出"""
+    failed_records = expand_failed(failed_records)
     if failed_records:
         print(c_err(f"本次失败{len(failed_records)}条:"))
         for r, reason in failed_records:
@@ -410,6 +794,124 @@ def print_failed_records(failed_records):
             print(c_warn(f"保存日志失败: {e}"))
 
 
+# 整批导入：按通用批量锁班模板在内存中生成Excel，通过门户的导入功能一次上传
+IMPORT_FILE_INPUT = "input[type=file]"   # 门户导入文件控件
+IMPORT_BUTTON = "导入"                    # 上传后点击的按钮
+IMPORT_SHEET = "锁班数据"
+IMPORT_HEADERS = ["员工号", "姓名", "锁班类型", "开始日期", "结束日期"]
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+READ_TABLE_JS = """(selector) => Array.from(
+    document.querySelectorAll(selector + ' tbody.list tr'),
+    tr => Array.from(tr.querySelectorAll('td'), td => td.innerText.trim())
+)"""
+
+
+def build_import_workbook(records) -> bytes:
+    """按通用批量锁班模板的格式生成导入文件内容"""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = IMPORT_SHEET
+    ws.append(IMPORT_HEADERS)
+    for r in records:
+        leave_name = LEAVE_CODE_TO_NAME.get(r["请假类型"], r["请假类型"])
+        ws.append([r["员工号"], r["姓名"] or "", leave_name, r["开始日期"], r["结束日期"]])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    wb.close()
+    return buffer.getvalue()
+
+
+def read_result_table(page, selector):
+    """一次取回结果表格所有行的单元格文字"""
+    return page.evaluate(READ_TABLE_JS, selector)
+
+
+def row_lock(cells):
+    """结果行中的(员工号, 锁班类型代码, 开始日期, 结束日期)，认不出的字段为None"""
+    record = parse_single_record(" ".join(cells))
+    return record["员工号"], record["请假类型"], record["开始日期"], record["结束日期"]
+
+
+def same_lock(row, record):
+    """结果行是不是这条记录；结果行里认不出的类型或日期不参与比较"""
+    values = (record["员工号"], record["请假类型"], record["开始日期"], record["结束日期"])
+    return row[0] == values[0] and all(v is None or v == w for v, w in zip(row[1:], values[1:]))
+
+
+def overlaps_lock(row, record):
+    """冲突行列出的是和记录日期重叠的锁班：同一员工且日期重叠，冲突行没有日期时只比员工号"""
+    emp_id, _, start, end = row
+    if emp_id != record["员工号"]:
+        return False
+    if not start:
+        return True
+    return start <= (record["结束日期"] or record["开始日期"]) and record["开始日期"] <= (end or start)
+
+
+def bulk_submit(page, records):
+    """整批导入记录，返回失败记录[(record, 原因)]"""
+    page.set_input_files(IMPORT_FILE_INPUT, files=[{
+        "name": "通用批量锁班模板.xlsx",
+        "mimeType": XLSX_MIME,
+        "buffer": build_import_workbook(records),
+    }])
+    page.get_by_role("button", name=IMPORT_BUTTON).click()
+    # 等待继续录入按钮出现,说明结果页加载完成
+    page.get_by_role("button", name="继续录入").wait_for()
+    result_rows = read_result_table(page, "#showNonproductionTaskImportResultPage1")
+    conflict_rows = read_result_table(page, "#showNonproductionTaskImportResultPage2")
+    # 按(员工号, 类型, 开始日期, 结束日期)核对，同一员工的多条记录互不影响
+    by_emp = {}
+    for i, r in enumerate(records):
+        by_emp.setdefault(r["员工号"], []).append(i)
+    results = {}
+    for cells in result_rows:
+        row = row_lock(cells)
+        results.setdefault(row[0], []).append(row)
+    imported = set()
+    for emp_id, indexes in by_emp.items():
+        rows = list(results.get(emp_id, []))
+        for i in indexes:
+            match = next((row for row in rows if same_lock(row, records[i])), None)
+            if match:
+                rows.remove(match)
+                imported.add(i)
+    # 每个冲突行归到和它日期重叠的一条记录；同批记录互相冲突时，
+    # 冲突行就是先导入的那条，归到后面没导入的记录上
+    conflicts = {}
+    for cells in conflict_rows:
+        row = row_lock(cells)
+        overlapping = [i for i in by_emp.get(row[0], []) if overlaps_lock(row, records[i])]
+        if not overlapping:
+            continue
+        candidates = [i for i in overlapping
+                      if not (i in imported and same_lock(row, records[i]))] or overlapping
+        target = next((i for i in candidates if i not in conflicts), candidates[0])
+        conflicts.setdefault(target, " ".join(cells))
+    failed_records = []
+    for i, r in enumerate(records):
+        if i in conflicts:
+            failed_records.append((r, conflicts[i]))
+        elif i not in imported:
+            failed_records.append((r, "导入结果中没有该记录"))
+    go_back_to_form(page)
+    return failed_records
+
+
+def bulk_mode_run(page, records):
+    """整批导入并输出结果，返回失败记录"""
+    print(c_info(f"整批导入{len(records)}条..."))
+    try:
+        failed = bulk_submit(page, records)
+    except Exception as e:
+        beep_error()
+        print(c_err(f"整批导入失败: {e}"))
+        return [(r, f"整批导入失败: {e}") for r in records]
+    print(c_ok(f"整批导入完成,成功{len(records) - len(failed)}条,失败{len(failed)}条"))
+    return failed
+
+
 def batch_mode(page, whitelist):
     """批量模式"""
     failed_records = []  # 记录失败的条目
@@ -424,25 +926,39 @@ def batch_mode(page, whitelist):
             print(c_err("解析错误:"))
             for err in errors:
                 print(c_err(err))
+        records = plan_submissions(records)
+        records, overlaps = split_overlaps(records)
+        if overlaps:
+            print(c_warn(f"以下{len(overlaps)}条与同一员工的其他记录日期重叠,不提交:"))
+            for r, reason in overlaps:
+                print(c_warn(f"  {format_record(r)} - {reason}"))
         if not records:
             print(c_err("没有可处理的记录"))
             continue
         print(c_ok(f"共{len(records)}条有效数据:"))
         for i, r in enumerate(records, 1):
-            print(f"{i}. {format_record(r)}")
-        confirm = input(c_hint("y开始填写,n重新粘贴,b返回主菜单: ")).strip().lower()
+            merged = f" (合并{len(r['原始记录'])}行)" if "原始记录" in r else ""
+            print(f"{i}. {format_record(r)}{merged}")
+        confirm = input(c_hint("y开始填写,u整批导入,n重新粘贴,b返回主菜单: ")).strip().lower()
         if confirm == 'b':
             return
+        if confirm in ('y', 'u'):
+            failed_records.extend(overlaps)
+        if confirm == 'u':
+            failed_records.extend(bulk_mode_run(page, records))
+            print_failed_records(failed_records)
+            return
         if confirm != 'y':
             continue
+        start_run()
         i = 0
         while i < len(records):
             record = records[i]
             print(f"{c_info(f'[{i+1}/{len(records)}]')} 填写: {format_record(record)}")
             try:
-                fill_form(page, record["员工号"], record["请假类型"], record["开始日期"], record["结束日期"])
-                print(c_ok("填表完成,提交中..."))
-                success, conflict_info = submit_and_check(page)
+                timings = fill_form(page, record["员工号"], record["请假类型"], record["开始日期"], record["结束日期"])
+                print(c_ok(f"填表完成({format_timings(timings)}),提交中..."))
+                success, conflict_info = timed_submit(page, record, timings)
                 if success:
                     print(c_ok("提交成功"))
                     i += 1
@@ -459,6 +975,7 @@ def batch_mode(page, whitelist):
                 failed_records.append((record, str(e)))
                 i += 1
         print(c_ok("批量处理完成"))
+        print(c_info(step_report()))
         print_failed_records(failed_records)
         return
 
@@ -488,9 +1005,9 @@ def manual_mode(page, whitelist):
         while True:
             print(f"填写: {format_record(record)}")
             try:
-                fill_form(page, record["员工号"], record["请假类型"], record["开始日期"], record["结束日期"])
-                print(c_ok("填表完成,提交中..."))
-                success, conflict_info = submit_and_check(page)
+                timings = fill_form(page, record["员工号"], record["请假类型"], record["开始日期"], record["结束日期"])
+                print(c_ok(f"填表完成({format_timings(timings)}),提交中..."))
+                success, conflict_info = timed_submit(page, record, timings)
                 if success:
                     print(c_ok("提交成功"))
                     break
@@ -532,28 +1049,42 @@ def excel_mode(page, whitelist):
             for err in errors:
                 print(c_err(f"  {err}"))
         
+        records = plan_submissions(records)
+        records, overlaps = split_overlaps(records)
+        if overlaps:
+            print(c_warn(f"以下{len(overlaps)}条与同一员工的其他记录日期重叠,不提交:"))
+            for r, reason in overlaps:
+                print(c_warn(f"  {format_record(r)} - {reason}"))
         if not records:
             print(c_err("没有可处理的记录"))
             continue
         
         print(c_ok(f"共{len(records)}条有效数据:"))
         for i, r in enumerate(records, 1):
-            print(f"{i}. {format_record(r)}")
+            merged = f" (合并{len(r['原始记录'])}行)" if "原始记录" in r else ""
+            print(f"{i}. {format_record(r)}{merged}")
         
-        confirm = input(c_hint("y开始填写,n重新选择,b返回主菜单: ")).strip().lower()
+        confirm = input(c_hint("y开始填写,u整批导入,n重新选择,b返回主菜单: ")).strip().lower()
         if confirm == 'b':
             return
+        if confirm in ('y', 'u'):
+            failed_records.extend(overlaps)
+        if confirm == 'u':
+            failed_records.extend(bulk_mode_run(page, records))
+            print_failed_records(failed_records)
+            return
         if confirm != 'y':
             continue
+        start_run()
         
         i = 0
         while i < len(records):
             record = records[i]
             print(f"{c_info(f'[{i+1}/{len(records)}]')} 填写: {format_record(record)}")
             try:
-                fill_form(page, record["员工号"], record["请假类型"], record["开始日期"], record["结束日期"])
-                print(c_ok("填表完成,提交中..."))
-                success, conflict_info = submit_and_check(page)
+                timings = fill_form(page, record["员工号"], record["请假类型"], record["开始日期"], record["结束日期"])
+                print(c_ok(f"填表完成({format_timings(timings)}),提交中..."))
+                success, conflict_info = timed_submit(page, record, timings)
                 if success:
                     print(c_ok("提交成功"))
                     i += 1
@@ -570,10 +1101,14 @@ def excel_mode(page, whitelist):
                 failed_records.append((record, str(e)))
                 i += 1
         print(c_ok("Excel导入完成"))
+        print(c_info(step_report()))
         print_failed_records(failed_records)
         return
 
 
+PORTAL_URL = os.environ.get("IEB_PORTAL_URL", "https://ieb.csair.com")  # 门户地址，可用环境变量指向模拟门户
+
+
 def main():
     print(c_info("通用锁班助手"))
     # 浏览器路径
@@ -596,7 +1131,7 @@ def main():
     page = context.new_page()
     # 登录
     try:
-        page.goto("https://ieb.csair.com/login")
+        page.goto(f"{PORTAL_URL}/login")
         page.wait_for_load_state("networkidle")
         page.locator("#scanLogin").wait_for()
         page.locator("#scanLogin").click()
@@ -611,7 +1146,7 @@ def main():
     # 导航到非生产任务录入页面
     try:
         print(c_info("正在进入非生产任务录入页面..."))
-        page.goto("https://ieb.csair.com/index/index")
+        page.goto(f"{PORTAL_URL}/index/index")
         page.wait_for_load_state("networkidle")
         page.get_by_text("运行管理").nth(1).wait_for()
         page.get_by_text("运行管理").nth(1).click()
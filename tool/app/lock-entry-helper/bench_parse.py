@@ -0,0 +1,430 @@
+# 解析基准
+# python bench_parse.py [行数]                 新分词器和改动前的实现对比速度，并核对输出一致(有意改变的行为除外)
+# python bench_parse.py --suite [--full] [--save]  各解析函数的吞吐和峰值内存，和基线比较，退步超过阈值或没有基线时退出码为1
+
+import re
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from app import (HAS_OPENPYXL, LEAVE_NAME_TO_CODE, LEAVE_TYPE_MAP, normalize_date,
+                 parse_batch_input, parse_excel_file, parse_leave_type, parse_single_record,
+                 parse_whitelist, split_continuous_text)
+
+if HAS_OPENPYXL:
+    from openpyxl import Workbook
+
+
+# ---------- 旧实现，作为对照 ----------
+# 以下函数原样复制自改动前的 app.py(只改了函数名)，不要跟着新规则修改
+
+def legacy_normalize_date(date_str: str) -> str:
+    """把各种日期格式统一转成YYYY-MM-DD"""
+    parts = re.split(r'[-/]', date_str)
+    if len(parts) == 3:
+        year, month, day = parts
+        return f"{year}-{month.zfill(2)}-{day.zfill(2)}"
+    return date_str
+
+
+def legacy_parse_single_record(text: str) -> dict:
+    """解析单条记录"""
+    result = {"员工号": None, "姓名": None, "请假类型": None, "开始日期": None, "结束日期": None}
+    emp = re.search(r'\b(\d{6})\b', text)
+    if emp:
+        result["员工号"] = emp.group(1)
+    name = re.search(r'\d{6}\s*([\u4e00-\u9fa5]{2,4})', text)
+    if name:
+        result["姓名"] = name.group(1)
+    # 使用新的解析函数
+    for key, val in LEAVE_TYPE_MAP.items():
+        if key in text or val in text:
+            result["请假类型"] = val
+            break
+    dates = re.findall(r'\d{4}[-/]\d{1,2}[-/]\d{1,2}', text)
+    if dates:
+        result["开始日期"] = legacy_normalize_date(dates[0])
+        result["结束日期"] = legacy_normalize_date(dates[1]) if len(dates) > 1 else legacy_normalize_date(dates[0])
+    return result
+
+
+def legacy_parse_whitelist(text: str) -> set:
+    """解析员工号白名单"""
+    all_nums = re.findall(r'\d{6}', re.sub(r'\D', ' ', text))
+    if all_nums:
+        return set(all_nums)
+    text = re.sub(r'\D', '', text)
+    return set(text[i:i+6] for i in range(0, len(text), 6) if len(text[i:i+6]) == 6)
+
+
+def legacy_split_continuous_text(text: str) -> list:
+    """把连续粘贴的文本按员工号切分成多条记录"""
+    # 按6位员工号切分
+    parts = re.split(r'(?=\d{6}[\u4e00-\u9fa5])', text)
+    return [p.strip() for p in parts if p.strip() and re.search(r'\d{6}', p)]
+
+
+# ---------- 有意改变的行为 ----------
+# 新旧输出不同时，把旧输出按下面的规则改写，改写后和新输出相同才算预期内的差异。
+# 每条规则独立写出，不调用 app 里的解析实现：
+#   员工号      边界不再用\b：\b把汉字当成单词字符，123456张三 原来识别不出员工号；
+#               现在只要求两侧不紧挨数字、字母和下划线
+#   请假类型    取文本里第一次出现的全称或代码，同一位置长的优先，和字典顺序无关；
+#               代码两侧不能紧挨字母或下划线，ALV 不再匹配 ALV_FD 里面
+#   连写切分    切分点前面是数字或字母时不切(1234567张三、A123456张三、2026010张三)，
+#               前面是上一条日期的日(2026-01-05123456张三)时照常切
+#   日期格式化  normalize_date 只改写 年-月-日 形式的数字日期，其他内容原样返回；语料里只有数字日期，不单独统计
+# parse_batch_input 也有意改变了：原来只有整段粘贴是一行且超过100字时才切分，现在逐行处理，
+# 一行里有两处以上记录起点时才切。它依赖切分和单条解析，这里不单独对比
+
+INTENDED_EMP_RE = re.compile(r'(?<![\dA-Za-z_])(\d{6})(?![\dA-Za-z_])')
+INTENDED_RECORD_START_RE = re.compile(r'(?:(?<![\dA-Za-z_])|(?<=[-/]\d\d))(?=\d{6}[\u4e00-\u9fa5])')
+INTENDED_LEAVE_TOKENS = sorted({**LEAVE_TYPE_MAP, **{v: v for v in LEAVE_TYPE_MAP.values()}}.items(),
+                             key=lambda item: len(item[0]), reverse=True)
+
+
+def intended_emp(text):
+    emp = INTENDED_EMP_RE.search(text)
+    return emp.group(1) if emp else None
+
+
+def intended_leave_type(text):
+    """逐个位置找，同一位置先试长的，代码两侧不能紧挨字母或下划线"""
+    for i in range(len(text)):
+        for token, code in INTENDED_LEAVE_TOKENS:
+            if not text.startswith(token, i):
+                continue
+            if token == code:
+                end = i + len(token)
+                if (i and re.match(r'[A-Za-z_]', text[i-1])) or re.match(r'[A-Za-z_]', text[end:end+1]):
+                    continue
+            return code
+    return None
+
+
+def intended_split(text):
+    parts = INTENDED_RECORD_START_RE.split(text)
+    return [p.strip() for p in parts if p.strip() and re.search(r'\d{6}', p)]
+
+
+# (名称, 字段, 规则)
+INTENDED_DIFFS = [
+    ("员工号边界", "员工号", intended_emp),
+    ("类型最长匹配", "请假类型", intended_leave_type),
+]
+
+DATE_TEXT_RE = re.compile(r'\d{4}[-/]\d{1,2}[-/]\d{1,2}')
+
+
+# ---------- 测试语料 ----------
+
+NAMES = ["张三", "李四", "王小明", "欧阳娜娜", "赵六"]
+SEPS = ["\t", " ", "  ", "，", ""]
+
+
+def make_line(rnd):
+    """模拟从Excel复制的一行：员工号、姓名、类型(全称/代码/中文名)、一到两个日期"""
+    full = rnd.choice(list(LEAVE_TYPE_MAP))
+    leave = rnd.choice([full, LEAVE_TYPE_MAP[full], full.split('-', 1)[1]])
+    sep = rnd.choice(SEPS)
+    date_sep = rnd.choice("-/")
+    dates = [f"2026{date_sep}{rnd.randint(1, 12)}{date_sep}{rnd.randint(1, 28)}"
+             for _ in range(rnd.randint(1, 2))]
+    return sep.join([f"{rnd.randint(100000, 999999)}", rnd.choice(NAMES), leave] + dates)
+
+
+def make_noise(rnd):
+    """边界情况：数字连写、代码前后缀、全角数字、残缺日期"""
+    pieces = ["123456", "1234567", "12345", "张三", " ", "\t", "-", "/", "2026-01-05",
+              "2026/1/5", "12-01-05", "0512", "TRNG1", "ALV", "ALV_FD", "T/A", "年假",
+              "x", "_", "１２３４５６", "2026-01-0512", "20260105"]
+    return "".join(rnd.choice(pieces) for _ in range(rnd.randint(1, 10)))
+
+
+def make_corpus(n, seed=0):
+    rnd = random.Random(seed)
+    return [make_line(rnd) if i % 10 else make_noise(rnd) for i in range(n)]
+
+
+# ---------- 对比 ----------
+
+def check_identical(lines):
+    """逐行比较新旧输出，返回 (预期内差异的分类计数, 预期外不一致的行)"""
+    intended = {}
+    diffs = []
+    for line in lines:
+        new = parse_single_record(line)
+        old = legacy_parse_single_record(line)
+        if new == old:
+            continue
+        expected = dict(old)
+        hit = []
+        for name, field, rule in INTENDED_DIFFS:
+            expected[field] = rule(line)
+            if expected[field] != old[field]:
+                hit.append(name)
+        if new == expected:
+            for name in hit:
+                intended[name] = intended.get(name, 0) + 1
+        else:
+            diffs.append(line)
+    pasted = "".join(lines)
+    new_split = split_continuous_text(pasted)
+    if new_split != legacy_split_continuous_text(pasted):
+        if new_split == intended_split(pasted):
+            intended["连写切分"] = 1
+        else:
+            diffs.append("<split_continuous_text>")
+    if parse_whitelist(pasted) != legacy_parse_whitelist(pasted):
+        diffs.append("<parse_whitelist>")
+    for date in DATE_TEXT_RE.findall(pasted):
+        if normalize_date(date) != legacy_normalize_date(date):
+            diffs.append(date)
+    return intended, diffs
+
+
+def timed(func, lines):
+    start = time.perf_counter()
+    for line in lines:
+        func(line)
+    return time.perf_counter() - start
+
+
+def compare_legacy(n):
+    lines = make_corpus(n)
+
+    intended, diffs = check_identical(lines)
+    if diffs:
+        print(f"输出不一致 {len(diffs)} 行，例如:")
+        for line in diffs[:5]:
+            print(f"  {line!r}")
+        sys.exit(1)
+    print(f"{n}行输出一致，有意改变的行为除外:")
+    for name, _, _ in INTENDED_DIFFS:
+        print(f"  {name}: {intended.get(name, 0)}行")
+    print(f"  连写切分: {'整段切分结果不同' if intended.get('连写切分') else '无差异'}")
+
+    old = timed(legacy_parse_single_record, lines)
+    new = timed(parse_single_record, lines)
+    print(f"单条解析 旧实现: {old:.2f}秒 {n / old:,.0f}行/秒")
+    print(f"单条解析 分词器: {new:.2f}秒 {n / new:,.0f}行/秒 (x{old / new:.2f})")
+    dates = DATE_TEXT_RE.findall("\n".join(lines))
+    old = timed(legacy_normalize_date, dates)
+    new = timed(normalize_date, dates)
+    print(f"日期格式化: 旧实现{len(dates) / old:,.0f}个/秒 分词器{len(dates) / new:,.0f}个/秒 (x{old / new:.2f})")
+
+
+# ---------- 基准套件：各解析函数的吞吐和峰值内存 ----------
+
+BASELINE_FILE = "bench_baseline.json"
+DEFAULT_SIZES = [10, 1000, 100000]
+FULL_SIZES = [10, 1000, 100000, 1000000]  # --full，加上100万行，Excel生成和解析要几分钟
+SPEED_THRESHOLD = 0.2    # 吞吐比基线低20%以上算退步
+MEMORY_THRESHOLD = 0.2   # 峰值内存比基线高20%以上算退步
+MEMORY_SLACK = 64 * 1024  # 峰值内存差小于64KB不算退步，小数据量时避免误报
+MIN_BLOCK_TIME = 0.2     # 每轮计时至少运行的秒数，小数据量时重复调用
+BLOCKS = 3               # 计时轮数，取最快的一轮
+
+
+def make_paste(n, seed=0):
+    """模拟一次粘贴：表头、空行、噪声行，部分行换行丢失和下一条连在一起"""
+    rnd = random.Random(seed)
+    parts = ["员工号\t姓名\t类型\t开始\t结束\n"]
+    for i in range(n):
+        parts.append(make_noise(rnd) if i % 50 == 49 else make_line(rnd))
+        parts.append(rnd.choices(["\n", "", "\n\n", "\r\n"], weights=[80, 10, 5, 5])[0])
+    return "".join(parts)
+
+
+def make_whitelist_text(n, seed=0):
+    """模拟粘贴的白名单：分隔符混用，偶尔整段连写"""
+    rnd = random.Random(seed)
+    seps = ["\n", ",", "，", " ", "\t", "、"]
+    return "".join(f"{rnd.randint(100000, 999999)}{rnd.choice(seps)}" for _ in range(n))
+
+
+def make_leave_inputs(n, seed=0):
+    """Excel锁班类型列的写法：代码、全称、中文名、中文名片段、无法识别的内容"""
+    rnd = random.Random(seed)
+    fulls = list(LEAVE_TYPE_MAP)
+    names = list(LEAVE_NAME_TO_CODE)
+    makers = [
+        lambda: LEAVE_TYPE_MAP[rnd.choice(fulls)],
+        lambda: rnd.choice(fulls),
+        lambda: rnd.choice(names),
+        lambda: rnd.choice(names)[:2],
+        lambda: f" {rnd.choice(fulls)}（备注）",
+        lambda: rnd.choice(["", "未知类型", "X", "123"]),
+    ]
+    return [rnd.choice(makers)() for _ in range(n)]
+
+
+def make_xlsx(path, n, seed=0):
+    """按Excel导入格式生成n行的文件，日期有单元格日期和两种文本写法，夹带错误行"""
+    rnd = random.Random(seed)
+    fulls = list(LEAVE_TYPE_MAP)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["员工号", "姓名", "锁班类型", "开始日期", "结束日期"])
+    for i in range(n):
+        if i % 50 == 49:
+            ws.append(rnd.choice([["12345", "张三", "ALV", "2026-01-05"], [None], ["123456", "李四", "未知类型", "2026/1/5"]]))
+            continue
+        emp = rnd.randint(100000, 999999)
+        full = rnd.choice(fulls)
+        leave = rnd.choice([full, LEAVE_TYPE_MAP[full], full.split('-', 1)[1]])
+        start = datetime(2026, rnd.randint(1, 12), rnd.randint(1, 28))
+        fmt = rnd.choice(["cell", "dash", "slash"])
+        if fmt == "dash":
+            start = start.strftime("%Y-%m-%d")
+        elif fmt == "slash":
+            start = f"{start.year}/{start.month}/{start.day}"
+        ws.append([rnd.choice([emp, str(emp)]), rnd.choice(NAMES), leave, start, rnd.choice([start, None])])
+    wb.save(path)
+
+
+def bench_cases(sizes, tmpdir):
+    """产出(函数名, 行数, 调用函数)，输入在计时前生成好"""
+    for n in sizes:
+        text = make_paste(n)
+        yield "parse_batch_input", n, lambda text=text: parse_batch_input(text)
+    for n in sizes:
+        text = make_whitelist_text(n)
+        yield "parse_whitelist", n, lambda text=text: parse_whitelist(text)
+    for n in sizes:
+        inputs = make_leave_inputs(n)
+        yield "parse_leave_type", n, lambda inputs=inputs: [parse_leave_type(t) for t in inputs]
+    if not HAS_OPENPYXL:
+        print("未安装openpyxl，跳过parse_excel_file")
+        return
+    for n in sizes:
+        path = os.path.join(tmpdir, f"bench_{n}.xlsx")
+        make_xlsx(path, n)
+        yield "parse_excel_file", n, lambda path=path: parse_excel_file(path)
+
+
+def measure(func, n):
+    """返回(每秒行数, 峰值内存字节)"""
+    best = 0
+    for _ in range(BLOCKS):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            func()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= MIN_BLOCK_TIME:
+                break
+        best = max(best, n * calls / elapsed)
+    # 峰值内存单独跑一次，tracemalloc会拖慢计时
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_regression(result, base, speed_threshold, memory_threshold):
+    """和基线比较，返回退步说明列表"""
+    problems = []
+    if result["rows_per_sec"] < base["rows_per_sec"] * (1 - speed_threshold):
+        problems.append(f"吞吐 {base['rows_per_sec']:,.0f} -> {result['rows_per_sec']:,.0f}行/秒")
+    if (result["peak_bytes"] > base["peak_bytes"] * (1 + memory_threshold)
+            and result["peak_bytes"] - base["peak_bytes"] > MEMORY_SLACK):
+        problems.append(f"峰值内存 {base['peak_bytes'] / 1024:,.0f} -> {result['peak_bytes'] / 1024:,.0f}KB")
+    return problems
+
+
+def run_suite(args):
+    baseline = load_baseline(args.baseline)
+    if baseline is None and not args.save:
+        # 没有基线就无法判断退步，不能算通过
+        print(f"没有基线文件 {args.baseline}，先在这台机器上加 --save 记录基线")
+        return 1
+    results = {}
+    regressions = []
+    missing = []
+    # 中文表头每个字占两格，按显示宽度补齐
+    print(f"{'函数':<18}{'行数':>8}{'行/秒':>12}{'峰值内存':>8}  基线对比")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name, n, func in bench_cases(args.sizes, tmpdir):
+            rows_per_sec, peak = measure(func, n)
+            result = {"rows_per_sec": rows_per_sec, "peak_bytes": peak}
+            results.setdefault(name, {})[str(n)] = result
+            note = ""
+            base = (baseline or {}).get("results", {}).get(name, {}).get(str(n))
+            if base:
+                note = (f"{rows_per_sec / base['rows_per_sec'] - 1:+.0%}吞吐 "
+                        f"{(peak - base['peak_bytes']) / 1024:+,.0f}KB")
+                problems = check_regression(result, base, args.speed_threshold, args.memory_threshold)
+                if problems:
+                    note += "  退步: " + "; ".join(problems)
+                    regressions.append(f"{name}[{n}] " + "; ".join(problems))
+            elif not args.save:
+                note = "基线里没有"
+                missing.append(f"{name}[{n}]")
+            print(f"{name:<20}{n:>10,}{rows_per_sec:>14,.0f}{peak / 1024:>10,.0f}KB  {note}")
+
+    if args.save:
+        data = {
+            "saved": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.node(),
+            "results": results,
+        }
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f"已保存基线: {args.baseline}")
+        return 0
+    if regressions:
+        print(f"{len(regressions)}项退步超过阈值:")
+        for line in regressions:
+            print(f"  {line}")
+    if missing:
+        print(f"{len(missing)}项在基线里没有，无法比较(用同样的 --sizes 加 --save 重新记录): {', '.join(missing)}")
+    return 1 if regressions or missing else 0
+
+
+def parse_sizes(text):
+    return [int(x) for x in text.split(',') if x.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="粘贴文本和Excel解析基准")
+    parser.add_argument("rows", nargs="?", type=int, default=100000, help="新旧实现对比的行数(默认100000)")
+    parser.add_argument("--suite", action="store_true", help="运行各解析函数的基准套件")
+    parser.add_argument("--sizes", type=parse_sizes, default=DEFAULT_SIZES,
+                        help="逗号分隔的行数，如10,1000,100000,1000000")
+    parser.add_argument("--full", action="store_true", help="行数用10,1000,100000,1000000")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help=f"基线文件(默认{BASELINE_FILE})")
+    parser.add_argument("--save", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--speed-threshold", type=float, default=SPEED_THRESHOLD,
+                        help="吞吐下降超过该比例算退步(默认0.2)")
+    parser.add_argument("--memory-threshold", type=float, default=MEMORY_THRESHOLD,
+                        help="峰值内存增长超过该比例算退步(默认0.2)")
+    args = parser.parse_args()
+    if args.full:
+        args.sizes = FULL_SIZES
+    if args.suite:
+        sys.exit(run_suite(args))
+    compare_legacy(args.rows)
+
+
+if __name__ == "__main__":
+    main()